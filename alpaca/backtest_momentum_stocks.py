@@ -1,24 +1,13 @@
 import requests
-from google.cloud import storage
-import alpaca_trade_api as tradeapi
+from alpaca_client import get_api, get_fetcher
 from datetime import datetime, timedelta
 import numpy as np
 import pandas as pd
 pd.set_option('mode.chained_assignment', None)
 import sys
 from pytz import timezone
-import ta.trend
 import discord_webhook
-
-# Get Alpaca API key and secret
-storage_client = storage.Client()
-bucket = storage_client.get_bucket('derek-algo-trading-bucket')
-blob = bucket.blob('alpaca-api-key.txt')
-api_key = blob.download_as_text()
-blob = bucket.blob('alpaca-secret-key.txt')
-secret_key = blob.download_as_text()
-base_url = 'https://paper-api.alpaca.markets'
-api = tradeapi.REST(api_key, secret_key, base_url, 'v2')
+from indicators.streaming import MACDBank, PivotLow
 
 # Price windows to filter stocks
 min_share_price = 5.0
@@ -33,50 +22,37 @@ default_stop = 0.95
 # How much of the portfolio to allocate to a position
 risk = 0.001
 
-def chunks(l, n):
-    n = max(1, n)
-    return (l[i:i+n] for i in range(0, len(l), n))
+# (fast, slow, signal) MACD windows for the buy and sell checks
+macd_windows = [(12, 26, 9), (40, 60, 9), (13, 21, 9)]
 
 def get_market_bar_data(symbols, market_open_dt, market_close_dt):
     print('Getting market data...')
     open = datetime.isoformat(pd.Timestamp(market_open_dt))
     close = datetime.isoformat(pd.Timestamp(market_close_dt))
-    market_data = {}
-    symbols_chunked = list(chunks(list(set(symbols)), 200))
-    for symbol_group in symbols_chunked:
-        minute_bars = api.get_barset(','.join(symbol_group), '15Min', start=open, end=close, limit=1000).df
-        for symbol in symbol_group:
-            market_data[symbol] = minute_bars[symbol]
+    fetcher = get_fetcher()
+    market_data = fetcher.get_barset_df(symbols, '15Min', start=open, end=close, limit=1000)
+    fetcher.print_stats()
     print('Success.')
     return market_data
 
 def get_1000m_history_data(symbols, market_open_dt):
     print('Getting historical data 1000 minutes before', market_open_dt.strftime('%Y-%m-%d'))
     open = datetime.isoformat(pd.Timestamp(market_open_dt))
-    minute_history = {}
-    c = 0
-    symbols_chunked = list(chunks(list(set(symbols)), 200))
-    for symbol_group in symbols_chunked:
-        minute_bars = api.get_barset(','.join(symbol_group), '15Min', until=open, limit=1000).df
-        for symbol in symbol_group:
-            minute_history[symbol] = minute_bars[symbol]
-            c += 1
-            print('{}/{}'.format(c, len(symbols)))
+    fetcher = get_fetcher()
+    minute_history = fetcher.get_barset_df(symbols, '15Min', until=open, limit=1000)
+    fetcher.print_stats()
     print('Success.')
     return minute_history
 
 def get_tickers(market_open_dt):
     print('Getting tickers from', market_open_dt.strftime('%Y-%m-%d'))
+    api = get_api()
+    fetcher = get_fetcher()
     assets = api.list_assets()
     symbols = [asset.symbol for asset in assets if asset.tradable]
 
-    day_bars = {}
-    symbols_chunked = list(chunks(list(set(symbols)), 200))
     open = datetime.isoformat(pd.Timestamp(market_open_dt))
-    for symbol_group in symbols_chunked:
-        day_group = api.get_barset(','.join(symbol_group), '1D', until=open, limit=1)
-        for symbol in symbol_group:
-            day_bars[symbol] = day_group[symbol]
+    day_bars = fetcher.get_barset(symbols, '1D', until=open, limit=1)
 
     tickers = []
     for symbol in symbols:
@@ -100,20 +76,9 @@ def get_tickers(market_open_dt):
     print('Success.')
     return tickers
 
-def find_stop(current_value, minute_history, now):
-    print('finding stop')
-    try:
-        series = minute_history['low'][-100:] \
-                    .dropna().resample('5min').min()
-        series = series[now.floor('1D'):]
-        diff = np.diff(series.values)
-        low_index = np.where((diff[:-1] <= 0) & (diff[1:] > 0))[0] + 1
-        if (low_index) > 0:
-            return series[low_index[-1]] - 0.01
-        return current_value * default_stop
-    except Exception as ex:
-        print(ex)
-    return current_value * default_stop
+def find_stop(current_value, pivot_low: PivotLow):
+    # Just under the day's latest 5-minute pivot low, kept up to date as bars arrive
+    return pivot_low.stop(current_value * default_stop)
 
 def run(market_open_dt, market_close_dt):
     tickers = get_tickers(market_open_dt)
@@ -128,6 +93,16 @@ def run(market_open_dt, market_close_dt):
     
     symbols = [ticker['ticker'] for ticker in tickers]
     minute_history = get_1000m_history_data(symbols, market_open_dt)
+    # Keep each symbol's MACDs up to date one bar at a time
+    macd_banks = {
+        symbol: MACDBank(macd_windows).seed(df['close'].values, df.index)
+        for symbol, df in minute_history.items()
+    }
+    # and their latest 5-minute pivot lows for the stop prices
+    pivot_lows = {
+        symbol: PivotLow(minutes=5).seed(df['low'].values, df.index)
+        for symbol, df in minute_history.items()
+    }
     
     # Simulat trading with $10k
     portfolio_value = float(10000)
@@ -168,6 +143,8 @@ def run(market_open_dt, market_close_dt):
             data['close'],
             data['volume']
         ]
+        macd_banks[symbol].update(data['close'], time)
+        pivot_lows[symbol].update(data['low'], time)
         volume_today[symbol] += data['volume']
 
         # Now check for buy/sell conditions
@@ -191,26 +168,18 @@ def run(market_open_dt, market_close_dt):
             # print(f'Daily % change: {daily_pct_change}')
             if ( daily_pct_change > .04 and volume_today[symbol] > 30000 ):
                 # Check for a positive, increasing MACD
-                hist = ta.trend.macd(
-                    minute_history[symbol]['close'].dropna(),
-                    window_fast=12,
-                    window_slow=26
-                )
+                hist = macd_banks[symbol].macd(12, 26)
                 if (
                     hist[-1] < 0 or
                     not (hist[-3] < hist[-2] < hist[-1])
                 ):
                     print('MACD is < 0 or is downtrending')
                     return
-                hist = ta.trend.macd(
-                    minute_history[symbol]['close'].dropna(),
-                    window_fast=40,
-                    window_slow=60
-                )
+                hist = macd_banks[symbol].macd(40, 60)
                 if hist[-1] < 0 or np.diff(hist)[-1] < 0:
                     print('MACD < 0 or diff is < 0')
                     return
-                stop_price = find_stop(close, minute_history[symbol], time)
+                stop_price = find_stop(close, pivot_lows[symbol])
                 stop_prices[symbol] = stop_price
 
                 target_prices[symbol] = close + (
@@ -250,11 +219,7 @@ def run(market_open_dt, market_close_dt):
             # Sell for loss if price is below stop price
             # Sell for loss if price is below purchase and MACD < 0
             # Sell for profit if it's above target price
-            hist = ta.trend.macd(
-                minute_history[symbol]['close'].dropna(),
-                window_fast=13,
-                window_slow=21
-            )
+            hist = macd_banks[symbol].macd(13, 21)
             if (
                 close <= stop_prices[symbol] or
                 (close >= target_prices[symbol] and hist[-1] <= 0) or
@@ -323,7 +288,7 @@ if __name__ == "__main__":
     nyc = timezone('America/New_York')
     today_str = sys.argv[1]
     today = datetime.strptime(today_str, '%Y-%m-%d').astimezone(nyc)
-    calendar = api.get_calendar(start=today_str, end=today_str)[0]
+    calendar = get_api().get_calendar(start=today_str, end=today_str)[0]
     if calendar.date.strftime('%Y-%m-%d') == today_str:
         market_open = today.replace(
             hour=calendar.open.hour,
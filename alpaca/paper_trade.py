@@ -1,24 +1,18 @@
+import os
 import websocket
 import json
 import math
 import _thread
-from google.cloud import storage
-from alpaca_trade_api import REST
+from alpaca_client import BASE_URL, get_api, get_credentials
 from datetime import datetime
-import numpy as np
-import pandas as pd
-pd.set_option('mode.chained_assignment', None)
-import btalib
+from indicators.streaming import OBVCross
 
 # Get Alpaca API key and secret
-storage_client = storage.Client.from_service_account_json('./splendid-cirrus-302501-7e3faab608d2.json')
-bucket = storage_client.get_bucket('derek-algo-trading-bucket')
-blob = bucket.blob('alpaca-api-key.txt')
-api_key = blob.download_as_text()
-blob = bucket.blob('alpaca-secret-key.txt')
-secret_key = blob.download_as_text()
-base_url = 'https://paper-api.alpaca.markets'
-api = REST(api_key, secret_key, base_url, 'v2')
+# using the bot's service account if the bucket has to be read
+os.environ.setdefault('GOOGLE_APPLICATION_CREDENTIALS', './splendid-cirrus-302501-7e3faab608d2.json')
+api_key, secret_key = get_credentials()
+base_url = BASE_URL
+api = get_api()
 
 # Load the selected stocks from the watchlist
 symbols = []
@@ -43,17 +37,14 @@ if positions:
 print('=======================================')
 print()
 
-# Get 5Min candlestick data and calculate OBV and OBV_EMA
+# Get 5Min candlestick data and seed the OBV and OBV_EMA
+# Each new bar then updates them in constant time
 print('Initializing bot...')
 bars_group = api.get_barset(','.join(symbols), '5Min', limit=1000).df
-symbol_bars = {}
+symbol_indicators = {}
 for symbol in symbols:
     df = bars_group[symbol]
-    obv = btalib.obv(df).df
-    df['obv'] = obv['obv']
-    df['obv_ema'] = df['obv'].ewm(span=20).mean()
-    # df['time'] = df.index.values
-    symbol_bars[symbol] = df
+    symbol_indicators[symbol] = OBVCross(span=20).seed(df['close'].values, df['volume'].values)
     latest_dt = df.index[len(df.index) - 1]
     print(f'Latest 5Min bar for {symbol}: {latest_dt}')
 
@@ -86,29 +77,9 @@ def process_bar(data):
         open, high, low, close, volume = data['o'], data['h'], data['l'], data['c'], data['v']
         print('{0}: {1} - close=${2} , volume={3}'.format(end_dt, symbol, ('%.2f' % close), volume))
 
-        # Load the symbol's past 5min bars
-        df = symbol_bars[symbol]
-
         try:
-            # Add bar to DataFrame
-            row = pd.Series({
-                'open': open,
-                'high': high,
-                'low': low,
-                'close': close,
-                'volume': volume,
-                'obv': np.nan,
-                'obv_ema': np.nan
-            }, name=end_dt)
-            df = df.append(row)
-
-            # Recalculate OBV
-            obv = btalib.obv(df).df
-            df['obv'] = obv['obv']
-            df['obv_ema'] = df['obv'].ewm(span=20).mean()
-
-            # Store updated DataFrame
-            symbol_bars[symbol] = df
+            # Add the bar to the symbol's running OBV and OBV_EMA
+            symbol_indicators[symbol].update(close, volume)
         except Exception as ex:
             print('Error:', ex)
         
@@ -126,11 +97,10 @@ def process_trade(symbol):
         position = None
 
     try:
-        df = symbol_bars[symbol]
-        last = len(df.index) - 1
-        obv = df['obv'][last]
-        obv_ema = df['obv_ema'][last]
-        close_price = df['close'][last]
+        indicators = symbol_indicators[symbol]
+        obv = indicators.obv.value
+        obv_ema = indicators.obv_ema.value
+        close_price = indicators.close
     
         # Look to buy
         if not position and close_price > 0:
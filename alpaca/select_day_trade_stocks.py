@@ -1,40 +1,23 @@
-from google.cloud import storage
+from alpaca_client import get_api
 import pandas as pd
 pd.set_option('mode.chained_assignment', None)
-from alpaca_trade_api import REST
 from datetime import datetime
+from bar_store import BarStore
 
 def unix_time_sec(dt):
     epoch = datetime.utcfromtimestamp(0)
     return int((dt - epoch).total_seconds())
 
-def chunks(l, n):
-    n = max(1, n)
-    return (l[i:i+n] for i in range(0, len(l), n))
-
 def select_day_trade_stocks(event, context):
-    # Get Alpaca API key and secret
-    storage_client = storage.Client()
-    bucket = storage_client.get_bucket('derek-algo-trading-bucket')
-    blob = bucket.blob('alpaca-api-key.txt')
-    api_key = blob.download_as_text()
-    blob = bucket.blob('alpaca-secret-key.txt')
-    secret_key = blob.download_as_text()
-    base_url = 'https://paper-api.alpaca.markets'
-    api = REST(api_key, secret_key, base_url, 'v2')
+    api = get_api()
 
     # Get all stocks
     assets = api.list_assets('active')
     symbols = [asset.symbol for asset in assets if asset.tradable]
 
     # Get past 50 days data for all stocks
-    data = {}
-    symbols_chunked = list(chunks(list(set(symbols)), 200))
-    for symbol_group in symbols_chunked:
-        print(f'Retrieving {len(symbol_group)} symbol data')
-        data_group = api.get_barset(','.join(symbol_group), '1D', limit=50).df
-        for symbol in symbol_group:
-            data[symbol] = data_group[symbol]
+    # Cloud Functions can only write to /tmp, which survives warm starts
+    data = BarStore(api, '/tmp/bars').get_bars(list(set(symbols)), '1D', limit=50)
     
     result_df = pd.DataFrame()
 
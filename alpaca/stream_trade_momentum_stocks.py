@@ -1,5 +1,5 @@
 import requests
-from google.cloud import storage
+from alpaca_client import BASE_URL, get_api, get_credentials, get_fetcher
 import alpaca_trade_api as tradeapi
 from datetime import datetime, timedelta
 import numpy as np
@@ -7,18 +7,11 @@ import pandas as pd
 pd.set_option('mode.chained_assignment', None)
 import time
 from pytz import timezone
-import ta.trend
 import discord_webhook
+from indicators.streaming import MACDBank, PivotLow
+from pattern_stream import PatternEvent, PatternStream
 
-# Get Alpaca API key and secret
-storage_client = storage.Client()
-bucket = storage_client.get_bucket('derek-algo-trading-bucket')
-blob = bucket.blob('alpaca-api-key.txt')
-api_key = blob.download_as_text()
-blob = bucket.blob('alpaca-secret-key.txt')
-secret_key = blob.download_as_text()
-base_url = 'https://paper-api.alpaca.markets'
-api = tradeapi.REST(api_key, secret_key, base_url, 'v2')
+base_url = BASE_URL
 
 session = requests.session()
 
@@ -35,76 +28,77 @@ default_stop = 0.95
 # How much of the portfolio to allocate to a position
 risk = 0.001
 
-def chunks(l, n):
-    n = max(1, n)
-    return (l[i:i+n] for i in range(0, len(l), n))
+# (fast, slow, signal) MACD windows for the buy and sell checks
+macd_windows = [(12, 26, 9), (40, 60, 9), (13, 21, 9)]
 
 def get_1000m_history_data(symbols):
     print('Getting historical data...')
-    minute_history = {}
-    c = 0
-    symbols_chunked = list(chunks(list(set(symbols)), 200))
-    for symbol_group in symbols_chunked:
-        minute_bars = api.get_barset(','.join(symbol_group), 'minute', limit=1000).df
-        for symbol in symbol_group:
-            minute_history[symbol] = minute_bars[symbol]
-            c += 1
-            print('{}/{}'.format(c, len(symbols)))
+    fetcher = get_fetcher()
+    minute_history = fetcher.get_barset_df(symbols, 'minute', limit=1000)
+    fetcher.print_stats()
     print('Success.')
     return minute_history
 
 def get_tickers():
     print('Getting current ticker data...')
+    api = get_api()
+    fetcher = get_fetcher()
     assets = api.list_assets()
     symbols = [asset.symbol for asset in assets if asset.tradable]
 
-    day_bars = {}
-    symbols_chunked = list(chunks(list(set(symbols)), 200))
-    for symbol_group in symbols_chunked:
-        day_group = api.get_barset(','.join(symbol_group), '1D', limit=1)
-        for symbol in symbol_group:
-            day_bars[symbol] = day_group[symbol]
+    day_bars = fetcher.get_barset(symbols, '1D', limit=1)
+    last_prices = fetcher.get_last_prices(symbols)
+    fetcher.print_stats()
+
+    # Only keep symbols with both a previous day bar and a last trade
+    symbols = [
+        symbol for symbol in symbols
+        if len(day_bars.get(symbol, [])) > 0 and symbol in last_prices
+    ]
+    prev_days = [day_bars[symbol][0] for symbol in symbols]
+    prev_close = np.array([bar.c for bar in prev_days], dtype=float)
+    prev_volume = np.array([bar.v for bar in prev_days], dtype=float)
+    prev_high = np.array([bar.h for bar in prev_days], dtype=float)
+    prev_low = np.array([bar.l for bar in prev_days], dtype=float)
+    last_price = np.array([last_prices[symbol] for symbol in symbols], dtype=float)
+
+    # Filter every symbol in one pass
+    with np.errstate(divide='ignore', invalid='ignore'):
+        change_perc = np.where(prev_low > 0, (prev_high - prev_low) / prev_low * 100, 0)
+    selected = np.flatnonzero(
+        (last_price >= min_share_price) &
+        (last_price <= max_share_price) &
+        (prev_volume * last_price > min_last_dv) &
+        (change_perc >= 3.5)
+    )
 
     tickers = []
-    for symbol in symbols:
-        try:
-            prevDay = day_bars[symbol][0]
-            prevVolume = prevDay.v
-            changePerc = (prevDay.h - prevDay.l) / prevDay.l * 100
-            lastTrade = api.get_last_trade(symbol)
-            lastPrice = lastTrade.price
-            if (
-                lastPrice >= min_share_price and
-                lastPrice <= max_share_price and
-                prevVolume * lastPrice > min_last_dv and
-                changePerc >= 3.5
-            ):
-                tickers.append({
-                    'ticker': symbol,
-                    'prevClose': prevDay.c,
-                    'volume': prevVolume
-                })
-        except Exception:
-            pass
+    for i in selected:
+        tickers.append({
+            'ticker': symbols[i],
+            'prevClose': prev_close[i],
+            'volume': prev_volume[i]
+        })
     print('Success.')
     return tickers
 
-def find_stop(current_value, minute_history, now):
-    print('finding stop')
-    try:
-        series = minute_history['low'][-100:] \
-                    .dropna().resample('5min').min()
-        series = series[now.floor('1D'):]
-        diff = np.diff(series.values)
-        low_index = np.where((diff[:-1] <= 0) & (diff[1:] > 0))[0] + 1
-        if (low_index) > 0:
-            return series[low_index[-1]] - 0.01
-        return current_value * default_stop
-    except Exception as ex:
-        discord_webhook.send_error(ex)
-    return current_value * default_stop
+def find_stop(current_value, pivot_low: PivotLow):
+    # Just under the day's latest 5-minute pivot low, kept up to date as bars arrive
+    return pivot_low.stop(current_value * default_stop)
+
+def log_pattern(event: PatternEvent):
+    if event.retracted:
+        print(f'{event.symbol}: {event.pattern} no longer forms on {event.timestamp}')
+    else:
+        print('{}: {} {} at ${}{}'.format(
+            event.symbol, event.direction, event.pattern, event.close,
+            ', confirmed by the OBV' if event.obv_confirmed else ''
+        ))
 
 def run(market_open_dt, market_close_dt):
+    # Get Alpaca API key and secret
+    api_key, secret_key = get_credentials()
+    api = get_api()
     conn = tradeapi.stream2.StreamConn(base_url=base_url, key_id=api_key, secret_key=secret_key)
     
     # If it's starting back up, load the watchlist
@@ -139,6 +133,20 @@ def run(market_open_dt, market_close_dt):
     print('Tracking {} symbols.'.format(len(symbols)))
 
     minute_history = get_1000m_history_data(symbols)
+    # Keep each symbol's MACDs up to date one bar at a time
+    macd_banks = {
+        symbol: MACDBank(macd_windows).seed(df['close'].values, df.index)
+        for symbol, df in minute_history.items()
+    }
+    # and their latest 5-minute pivot lows for the stop prices
+    pivot_lows = {
+        symbol: PivotLow(minutes=5).seed(df['low'].values, df.index)
+        for symbol, df in minute_history.items()
+    }
+    # Candlestick patterns are only logged for now, they don't drive any orders
+    patterns = PatternStream(on_pattern=log_pattern)
+    for symbol, df in minute_history.items():
+        patterns.seed(symbol, df)
     portfolio_value = float(api.get_account().portfolio_value)
 
     open_orders = {}
@@ -231,6 +239,9 @@ def run(market_open_dt, market_close_dt):
             data.close,
             data.volume
         ]
+        macd_banks[data.symbol].update(data.close, ts)
+        pivot_lows[data.symbol].update(data.low, ts)
+        patterns.update(data.symbol, data.open, data.high, data.low, data.close, data.volume, ts)
         volume_today[data.symbol] += data.volume
 
         # Next, check for existing orders for the stock
@@ -268,26 +279,18 @@ def run(market_open_dt, market_close_dt):
             print(f'Daily % change: {daily_pct_change}')
             if ( daily_pct_change > .04 and volume_today[symbol] > 30000 ):
                 # Check for a positive, increasing MACD
-                hist = ta.trend.macd(
-                    minute_history[symbol]['close'].dropna(),
-                    window_fast=12,
-                    window_slow=26
-                )
+                hist = macd_banks[symbol].macd(12, 26)
                 if (
                     hist[-1] < 0 or
                     not (hist[-3] < hist[-2] < hist[-1])
                 ):
                     print('MACD is < 0 or is downtrending')
                     return
-                hist = ta.trend.macd(
-                    minute_history[symbol]['close'].dropna(),
-                    window_fast=40,
-                    window_slow=60
-                )
+                hist = macd_banks[symbol].macd(40, 60)
                 if hist[-1] < 0 or np.diff(hist)[-1] < 0:
                     print('MACD < 0 or diff is < 0')
                     return
-                stop_price = find_stop(data.close, minute_history[symbol], ts)
+                stop_price = find_stop(data.close, pivot_lows[symbol])
                 stop_prices[symbol] = stop_price
 
                 target_prices[symbol] = data.close + (
@@ -327,11 +330,7 @@ def run(market_open_dt, market_close_dt):
             # Sell for loss if price is below stop price
             # Sell for loss if price is below purchase and MACD < 0
             # Sell for profit if it's above target price
-            hist = ta.trend.macd(
-                minute_history[symbol]['close'].dropna(),
-                window_fast=13,
-                window_slow=21
-            )
+            hist = macd_banks[symbol].macd(13, 21)
             if (
                 data.close <= stop_prices[symbol] or
                 (data.close >= target_prices[symbol] and hist[-1] <= 0) or
@@ -403,7 +402,7 @@ if __name__ == "__main__":
     nyc = timezone('America/New_York')
     today = datetime.today().astimezone(nyc)
     today_str = today.strftime('%Y-%m-%d')
-    calendar = api.get_calendar(start=today_str, end=today_str)[0]
+    calendar = get_api().get_calendar(start=today_str, end=today_str)[0]
     if calendar.date.strftime('%Y-%m-%d') == today_str:
         market_open = today.replace(
             hour=calendar.open.hour,
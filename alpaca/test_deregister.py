@@ -1,5 +1,5 @@
 import requests
-from google.cloud import storage
+from alpaca_client import BASE_URL, get_credentials
 import alpaca_trade_api as tradeapi
 from datetime import datetime, timedelta
 import numpy as np
@@ -10,19 +10,13 @@ from pytz import timezone
 import ta.trend
 import discord_webhook
 
-# Get Alpaca API key and secret
-storage_client = storage.Client()
-bucket = storage_client.get_bucket('derek-algo-trading-bucket')
-blob = bucket.blob('alpaca-api-key.txt')
-api_key = blob.download_as_text()
-blob = bucket.blob('alpaca-secret-key.txt')
-secret_key = blob.download_as_text()
-base_url = 'https://paper-api.alpaca.markets'
-api = tradeapi.REST(api_key, secret_key, base_url, 'v2')
+base_url = BASE_URL
 
 session = requests.session()
 
 def run():
+    # Get Alpaca API key and secret
+    api_key, secret_key = get_credentials()
     # conn = tradeapi.stream2.StreamConn(base_url=base_url, key_id=api_key, secret_key=secret_key)
     conn = tradeapi.StreamConn(base_url=base_url, key_id=api_key, secret_key=secret_key)
 
@@ -0,0 +1,37 @@
+import time
+from credentials import get_secret
+
+BASE_URL = 'https://paper-api.alpaca.markets'
+
+_api = None
+_fetcher = None
+
+
+def get_credentials():
+    """Returns the Alpaca API key and secret."""
+    return get_secret('alpaca-api-key.txt'), get_secret('alpaca-secret-key.txt')
+
+
+def get_api():
+    """
+    Returns the shared Alpaca REST client, creating it on first use.
+    Later calls in the same process (or warm Cloud Function instance) reuse it.
+    """
+    global _api
+    if _api is None:
+        started = time.monotonic()
+        # Imported here so importing this module stays cheap
+        from alpaca_trade_api import REST
+        api_key, secret_key = get_credentials()
+        _api = REST(api_key, secret_key, BASE_URL, 'v2')
+        print('Alpaca client ready in {}s'.format('%.2f' % (time.monotonic() - started)))
+    return _api
+
+
+def get_fetcher():
+    """Returns the shared BarFetcher over the Alpaca client, creating it on first use."""
+    global _fetcher
+    if _fetcher is None:
+        from bar_fetcher import BarFetcher
+        _fetcher = BarFetcher(get_api())
+    return _fetcher
@@ -0,0 +1,42 @@
+"""
+Stand-alone copy of the repository's credentials.py, so the scripts in this
+directory still run from here and deploy on their own as Cloud Functions.
+It resolves secrets the same way, without the on-disk cache.
+"""
+import os
+
+BUCKET_NAME = 'derek-algo-trading-bucket'
+
+# Optional local directory with one file per secret, named like the bucket blobs
+CREDENTIALS_DIR = os.environ.get('CREDENTIALS_DIR')
+
+_secrets = {}
+
+
+def get_secret(blob_name):
+    """
+    Returns a secret stored in the GCS bucket, e.g. 'td-ameritrade-key.txt'.
+
+    Looked up in order from:
+      - the in-process cache
+      - an environment variable named after the blob ('TD_AMERITRADE_KEY')
+      - a file with the blob's name in CREDENTIALS_DIR
+      - the bucket itself
+    """
+    if blob_name in _secrets:
+        return _secrets[blob_name]
+
+    env_name = blob_name.replace('.txt', '').replace('-', '_').upper()
+    if os.environ.get(env_name):
+        secret = os.environ[env_name]
+    elif CREDENTIALS_DIR and os.path.exists(os.path.join(CREDENTIALS_DIR, blob_name)):
+        with open(os.path.join(CREDENTIALS_DIR, blob_name)) as secret_file:
+            secret = secret_file.read().strip()
+    else:
+        # Imported here so runs with local credentials never load the GCS client
+        from google.cloud import storage
+        bucket = storage.Client().get_bucket(BUCKET_NAME)
+        secret = bucket.blob(blob_name).download_as_text()
+
+    _secrets[blob_name] = secret
+    return secret
@@ -6,16 +6,13 @@ import pandas as pd
 import numpy as np
 from datetime import datetime
 from bs4 import BeautifulSoup
-from google.cloud import storage
+from credentials import get_secret
 from google.cloud import bigquery
 
 # Run in the evening to retrieve stock data from today
 def daily_quote_data(event, context):
     # Get TD Ameritrade API key
-    storage_client = storage.Client()
-    bucket = storage_client.get_bucket('derek-algo-trading-bucket')
-    blob = bucket.blob('td-ameritrade-key.txt')
-    api_key = blob.download_as_text()
+    api_key = get_secret('td-ameritrade-key.txt')
 
     # Check if the market was open today
     today = datetime.today().astimezone(pytz.timezone('US/Eastern'))
@@ -1,32 +1,236 @@
 import requests
 import string
 import time
+import json
+import os
 import pytz
 import sys
+import threading
 import pandas as pd
 import numpy as np
+from concurrent.futures import ThreadPoolExecutor, as_completed
 from datetime import datetime, timedelta
 from bs4 import BeautifulSoup
-from google.cloud import storage
+from credentials import get_secret
 from google.cloud import bigquery
 
+# TD Ameritrade allows 120 requests per minute
+TD_REQUESTS_PER_MINUTE = 110
+
+# Seconds to wait for TD Ameritrade to connect and respond
+REQUEST_TIMEOUT = float(os.environ.get('REQUEST_TIMEOUT', 30))
+
+BACKFILL_DIR = 'data/backfill'
+
+class TokenBucket:
+    """
+    Thread-safe token bucket that refills at `rate` tokens per second
+    and holds at most `capacity` tokens (same as bar_fetcher.TokenBucket,
+    copied so this script runs from its own directory).
+    """
+
+    def __init__(self, rate, capacity):
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = capacity
+        self.updated = time.monotonic()
+        self.lock = threading.Lock()
+
+    def acquire(self):
+        """Blocks until a token is available and takes it."""
+        while True:
+            with self.lock:
+                now = time.monotonic()
+                self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+                self.updated = now
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+                wait = (1 - self.tokens) / self.rate
+            time.sleep(wait)
+
 # Function to turn a datetime object into unix
 def unix_time_millis(date):
     dt = date.replace(hour=6)
     epoch = datetime.utcfromtimestamp(0)
     return int((dt - epoch).total_seconds() * 1000.0)
 
+def get_symbols():
+    # store uppercase alphabet
+    alpha = list(string.ascii_uppercase)
+
+    # Loop through each letter and get the stocks on that page
+    # and store them in a list
+    symbols = []
+    for each in alpha:
+        url = 'http://eoddata.com/stocklist/NYSE/{}.html'.format(each)
+        resp = requests.get(url)
+        site = resp.content
+        soup = BeautifulSoup(site, 'html.parser')
+        table = soup.find('table', {'class': 'quotes'})
+        for row in table.findAll('tr')[1:]:
+            symbols.append(row.findAll('td')[0].text.rstrip())
+    # Clean the symbols of extra characters
+    symbols_clean = []
+    for each in symbols:
+        each = each.replace('.', '-')
+        symbols_clean.append((each.split('-')[0]))
+
+    # Remove duplicate symbols caused by cleaning
+    symbols_unique = []
+    for each in symbols_clean:
+        if each not in symbols_unique:
+            symbols_unique.append(each)
+    return symbols_unique
+
+def price_history(api_key, symbol, start, end, limiter, retries=3):
+    """
+    Requests the daily candles of `symbol` from `start` through `end` in one call.
+    Returns the response json (which may have no candles), or None when the request failed.
+    """
+    req_url = f'https://api.tdameritrade.com/v1/marketdata/{symbol}/pricehistory'
+    params = {
+        'apikey': api_key,
+        'periodType': 'month',
+        'frequencyType': 'daily',
+        'frequency': '1',
+        'startDate': unix_time_millis(start),
+        'endDate': unix_time_millis(end),
+        'needExtendedHoursData': 'true'
+    }
+    for attempt in range(retries + 1):
+        limiter.acquire()
+        try:
+            response = requests.get(url=req_url, params=params, timeout=REQUEST_TIMEOUT)
+        except requests.RequestException as e:
+            # Timeouts and dropped connections are retried like server errors
+            print(f'Request for {symbol} failed: {e}')
+            time.sleep(2 ** attempt)
+            continue
+        # Back off when throttled or on server errors
+        if response.status_code == 429 or response.status_code >= 500:
+            time.sleep(2 ** attempt)
+            continue
+        if response.status_code != 200:
+            print(f'Request for {symbol} failed with status {response.status_code}')
+            return None
+        try:
+            return response.json()
+        except ValueError:
+            print(f'Response for {symbol} was not valid json')
+            return None
+    print(f'Giving up on {symbol} after {retries + 1} attempts')
+    return None
+
+def candles_frame(data_list):
+    """Builds one DataFrame from many pricehistory responses, a column at a time."""
+    data_list = [data for data in data_list if data.get('candles')]
+    if not data_list:
+        return pd.DataFrame(columns=[
+            'date', 'symbol', 'openPrice', 'closePrice', 'lowPrice', 'highPrice', 'totalVolume'
+        ])
+    counts = [len(data['candles']) for data in data_list]
+    candles = [candle for data in data_list for candle in data['candles']]
+    df = pd.DataFrame({
+        'date': np.fromiter((each['datetime'] for each in candles), dtype=np.int64, count=len(candles)),
+        'symbol': np.repeat([data.get('symbol', np.NaN) for data in data_list], counts),
+        'openPrice': np.fromiter((each['open'] for each in candles), dtype=float, count=len(candles)),
+        'closePrice': np.fromiter((each['close'] for each in candles), dtype=float, count=len(candles)),
+        'lowPrice': np.fromiter((each['low'] for each in candles), dtype=float, count=len(candles)),
+        'highPrice': np.fromiter((each['high'] for each in candles), dtype=float, count=len(candles)),
+        'totalVolume': np.fromiter((each['volume'] for each in candles), dtype=np.int64, count=len(candles))
+    })
+    # Convert date column from epoch
+    df['date'] = pd.to_datetime(df['date'], unit='ms').dt.date
+    return df
+
+def backfill(api_key, symbols, start, end, max_workers=4, flush_every=200):
+    """
+    Downloads every symbol's candles from `start` through `end`, one request per symbol.
+
+    Requests run concurrently under a shared rate limiter. Completed symbols are
+    written to Parquet parts every `flush_every` symbols and recorded in a checkpoint,
+    so running the same range again only requests the symbols that are left.
+    Symbols whose request failed are recorded as failed and requested again by the next run.
+    Returns all the candles of the range in one DataFrame.
+    """
+    directory = os.path.join(BACKFILL_DIR, f"{start.strftime('%Y-%m-%d')}_{end.strftime('%Y-%m-%d')}")
+    checkpoint_path = os.path.join(directory, 'checkpoint.json')
+    if not os.path.exists(directory):
+        os.makedirs(directory)
+    checkpoint = {'done': [], 'failed': [], 'parts': 0}
+    if os.path.exists(checkpoint_path):
+        with open(checkpoint_path) as f:
+            checkpoint.update(json.load(f))
+    done = set(checkpoint['done'])
+    remaining = [symbol for symbol in symbols if symbol not in done]
+    print(f"Backfilling {len(remaining)} symbols ({len(done)} already done, "
+          f"{len(checkpoint['failed'])} failed last time)...")
+    checkpoint['failed'] = []
+
+    def flush(data_list, completed, failed):
+        if data_list:
+            candles_frame(data_list).to_parquet(os.path.join(directory, f"part-{checkpoint['parts']}.parquet"))
+            checkpoint['parts'] += 1
+        checkpoint['done'].extend(completed)
+        checkpoint['failed'].extend(failed)
+        # Write then rename so an interrupted run never leaves a broken checkpoint
+        with open(checkpoint_path + '.tmp', 'w') as f:
+            json.dump(checkpoint, f)
+        os.replace(checkpoint_path + '.tmp', checkpoint_path)
+        print(f"{len(checkpoint['done'])}/{len(symbols)} symbols done, {len(checkpoint['failed'])} failed")
+
+    limiter = TokenBucket(TD_REQUESTS_PER_MINUTE / 60.0, 5)
+    data_list, completed, failed = [], [], []
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        futures = {
+            executor.submit(price_history, api_key, symbol, start, end, limiter): symbol
+            for symbol in remaining
+        }
+        try:
+            for future in as_completed(futures):
+                data = future.result()
+                # Only a successful response marks a symbol done, even one without candles
+                if data is None:
+                    failed.append(futures[future])
+                    continue
+                data_list.append(data)
+                completed.append(futures[future])
+                if len(completed) >= flush_every:
+                    flush(data_list, completed, failed)
+                    data_list, completed, failed = [], [], []
+        finally:
+            # Checkpoint what completed even when the loop was interrupted,
+            # and don't start the requests that are left
+            for future in futures:
+                future.cancel()
+            flush(data_list, completed, failed)
+
+    parts = [
+        pd.read_parquet(os.path.join(directory, f'part-{i}.parquet'))
+        for i in range(checkpoint['parts'])
+    ]
+    return pd.concat(parts, ignore_index=True) if parts else candles_frame([])
+
+# Backfill mode requests each symbol's whole range at once
+args = sys.argv[1:]
+backfill_mode = '--backfill' in args
+if backfill_mode:
+    args.remove('--backfill')
+
 # Get start and end dates
 try:
-    start_date = sys.argv[1]
+    start_date = args[0]
 except IndexError:
     print('Error: Must provide start date:')
     print('>>> python3 get_historical_data.py YYYY-MM-DD')
     print('OR')
     print('>>> python3 get_historical_data.py YYYY-MM-DD YYYY-MM-DD')
+    print('OR, to backfill a range concurrently and resume if interrupted')
+    print('>>> python3 get_historical_data.py --backfill YYYY-MM-DD YYYY-MM-DD')
     start_date = None
 try:
-    end_date = sys.argv[2]
+    end_date = args[1]
 except IndexError:
     end_date = start_date
 
@@ -56,108 +260,15 @@ if start_date and end_date:
     else:
         print(f'Retrieving missing data from {new_dates[0]} to {new_dates[len(new_dates)-1]}...')
         # Get TD Ameritrade API key
-        storage_client = storage.Client()
-        bucket = storage_client.get_bucket('derek-algo-trading-bucket')
-        blob = bucket.blob('td-ameritrade-key.txt')
-        api_key = blob.download_as_text()
-
-        # store uppercase alphabet
-        alpha = list(string.ascii_uppercase)
-
-        # Loop through each letter and get the stocks on that page
-        # and store them in a list
-        symbols = []
-        for each in alpha:
-            url = 'http://eoddata.com/stocklist/NYSE/{}.html'.format(each)
-            resp = requests.get(url)
-            site = resp.content
-            soup = BeautifulSoup(site, 'html.parser')
-            table = soup.find('table', {'class': 'quotes'})
-            for row in table.findAll('tr')[1:]:
-                symbols.append(row.findAll('td')[0].text.rstrip())
-        # Clean the symbols of extra characters
-        symbols_clean = []
-        for each in symbols:
-            each = each.replace('.', '-')
-            symbols_clean.append((each.split('-')[0]))
-        
-        # Remove duplicate symbols caused by cleaning
-        symbols_unique = []
-        for each in symbols_clean:
-            if each not in symbols_unique:
-                symbols_unique.append(each)
-
-        for date in new_dates:
-            print('========================')
-            print(f"Processing {date.strftime('%Y-%m-%d')}")
-            print('Each letter will appear as it completes retrieving data...')
-            currentLetter = symbols_unique[0][0]
-            data_list = []
-            for symbol in symbols_unique:
-                if symbol[0] != currentLetter:
-                    print(currentLetter)
-                    currentLetter = symbol[0]
-                req_url = f'https://api.tdameritrade.com/v1/marketdata/{symbol}/pricehistory?apikey={api_key}'
-                params = {
-                    'periodType': 'month',
-                    'frequencyType': 'daily',
-                    'frequency': '1',
-                    'startDate': unix_time_millis(date),
-                    'endDate': unix_time_millis(date),
-                    'needExtendedHoursData': 'true'
-                }
-                for key in params.keys():
-                    req_url = f'{req_url}&{key}={params[key]}'
-                response = requests.get(url=req_url)
-
-                # Check for status code 400, likely the market was not open that day
-                if response.status_code == 400:
-                    break
-
-                data_list.append(response.json())
-                time.sleep(.5)
-            
-            if data_list:
-                print('Z')
-            else:
-                print(f"Skipping {date.strftime('%Y-%m-%d')}, market was closed.\n")
-                continue
-
-            # Create a list for each data point and loop through the json, adding the data to the lists
-            print('Building DataFrame...')
-            symbl_l, open_l, high_l, low_l, close_l, volume_l, date_l = [], [], [], [], [], [], []
-            for data in data_list:
-                try:
-                    symbol_name = data['symbol']
-                except KeyError:
-                    symbol_name = np.NaN
-                try:
-                    for each in data['candles']:
-                        symbl_l.append(symbol_name)
-                        open_l.append(each['open'])
-                        high_l.append(each['high'])
-                        low_l.append(each['low'])
-                        close_l.append(each['close'])
-                        volume_l.append(each['volume'])
-                        date_l.append(each['datetime'])
-                except KeyError:
-                    pass
-
-            df = pd.DataFrame({
-                'date': date_l,
-                'symbol': symbl_l,
-                'openPrice': open_l,
-                'closePrice': close_l, 
-                'lowPrice': low_l,
-                'highPrice': high_l,
-                'totalVolume': volume_l
-            })
-
-            # Convert date column from epoch
-            df['date'] = pd.to_datetime(df['date'], unit='ms')
-            df['date'] = df['date'].dt.date
-
-            # Add to bigquery
+        api_key = get_secret('td-ameritrade-key.txt')
+
+        symbols_unique = get_symbols()
+
+        if backfill_mode:
+            df = backfill(api_key, symbols_unique, new_dates[0], new_dates[-1])
+            df = df[df['date'].isin(set(date.date() for date in new_dates))]
+
+            # Add to bigquery in one load job
             dataset_ref = client.dataset(dataset_id)
             table_ref = dataset_ref.table(table_id)
 
@@ -165,4 +276,84 @@ if start_date and end_date:
             job_config.autodetect = True
             job = client.load_table_from_dataframe(df, table_ref, job_config=job_config)
             job.result()
-            print(f'Data uploaded for {date}\n')
+            print(f'Data uploaded for {df["date"].nunique()} dates ({len(df.index)} rows)\n')
+        else:
+            for date in new_dates:
+                print('========================')
+                print(f"Processing {date.strftime('%Y-%m-%d')}")
+                print('Each letter will appear as it completes retrieving data...')
+                currentLetter = symbols_unique[0][0]
+                data_list = []
+                for symbol in symbols_unique:
+                    if symbol[0] != currentLetter:
+                        print(currentLetter)
+                        currentLetter = symbol[0]
+                    req_url = f'https://api.tdameritrade.com/v1/marketdata/{symbol}/pricehistory?apikey={api_key}'
+                    params = {
+                        'periodType': 'month',
+                        'frequencyType': 'daily',
+                        'frequency': '1',
+                        'startDate': unix_time_millis(date),
+                        'endDate': unix_time_millis(date),
+                        'needExtendedHoursData': 'true'
+                    }
+                    for key in params.keys():
+                        req_url = f'{req_url}&{key}={params[key]}'
+                    response = requests.get(url=req_url)
+
+                    # Check for status code 400, likely the market was not open that day
+                    if response.status_code == 400:
+                        break
+
+                    data_list.append(response.json())
+                    time.sleep(.5)
+            
+                if data_list:
+                    print('Z')
+                else:
+                    print(f"Skipping {date.strftime('%Y-%m-%d')}, market was closed.\n")
+                    continue
+
+                # Create a list for each data point and loop through the json, adding the data to the lists
+                print('Building DataFrame...')
+                symbl_l, open_l, high_l, low_l, close_l, volume_l, date_l = [], [], [], [], [], [], []
+                for data in data_list:
+                    try:
+                        symbol_name = data['symbol']
+                    except KeyError:
+                        symbol_name = np.NaN
+                    try:
+                        for each in data['candles']:
+                            symbl_l.append(symbol_name)
+                            open_l.append(each['open'])
+                            high_l.append(each['high'])
+                            low_l.append(each['low'])
+                            close_l.append(each['close'])
+                            volume_l.append(each['volume'])
+                            date_l.append(each['datetime'])
+                    except KeyError:
+                        pass
+
+                df = pd.DataFrame({
+                    'date': date_l,
+                    'symbol': symbl_l,
+                    'openPrice': open_l,
+                    'closePrice': close_l, 
+                    'lowPrice': low_l,
+                    'highPrice': high_l,
+                    'totalVolume': volume_l
+                })
+
+                # Convert date column from epoch
+                df['date'] = pd.to_datetime(df['date'], unit='ms')
+                df['date'] = df['date'].dt.date
+
+                # Add to bigquery
+                dataset_ref = client.dataset(dataset_id)
+                table_ref = dataset_ref.table(table_id)
+
+                job_config = bigquery.LoadJobConfig()
+                job_config.autodetect = True
+                job = client.load_table_from_dataframe(df, table_ref, job_config=job_config)
+                job.result()
+                print(f'Data uploaded for {date}\n')
@@ -0,0 +1,105 @@
+import os
+import sqlite3
+import pandas as pd
+from pandas.core.frame import DataFrame
+
+QUOTE_COLUMNS = ['date', 'symbol', 'closePrice', 'lowPrice', 'highPrice', 'totalVolume', 'volatility']
+
+# 'bigquery' in the cloud, 'local' to run against Parquet/SQLite files
+STOCK_DATA_BACKEND = os.environ.get('STOCK_DATA_BACKEND', 'bigquery')
+
+
+class BigQueryStore:
+    """Daily quotes, screening state and selections in the stock_data dataset."""
+
+    def __init__(self, dataset_id='stock_data'):
+        from google.cloud import bigquery
+        self.bigquery = bigquery
+        self.client = bigquery.Client()
+        self.dataset_id = dataset_id
+
+    def read_quotes(self, after_date=None) -> DataFrame:
+        """Returns the daily_quote_data rows after `after_date` (all of them if None)."""
+        sql = f"""
+            SELECT {', '.join(QUOTE_COLUMNS)}
+            FROM `splendid-cirrus-302501.{self.dataset_id}.daily_quote_data`
+        """
+        job_config = self.bigquery.QueryJobConfig()
+        if after_date is not None:
+            sql += ' WHERE date > @after_date'
+            job_config.query_parameters = [
+                self.bigquery.ScalarQueryParameter('after_date', 'DATE', after_date)
+            ]
+        return self.client.query(sql, job_config=job_config).to_dataframe()
+
+    def read_state(self) -> DataFrame:
+        from google.api_core.exceptions import NotFound
+        sql = f'SELECT * FROM `splendid-cirrus-302501.{self.dataset_id}.ewm_state`'
+        try:
+            return self.client.query(sql).to_dataframe()
+        except NotFound:
+            return pd.DataFrame()
+
+    def write_state(self, df: DataFrame):
+        self._write('ewm_state', df)
+
+    def write_selected(self, df: DataFrame):
+        self._write('selected_stocks', df)
+
+    def _write(self, table_id, df):
+        dataset_ref = self.client.dataset(self.dataset_id)
+        table_ref = dataset_ref.table(table_id)
+
+        job_config = self.bigquery.LoadJobConfig()
+        job_config.autodetect = True
+        job_config.write_disposition = 'WRITE_TRUNCATE' # Always replace table data
+        job = self.client.load_table_from_dataframe(df, table_ref, job_config=job_config)
+        job.result()
+
+
+class LocalStore:
+    """
+    Stand-in for BigQuery: daily quotes are read from a Parquet file,
+    screening state and selections are kept in SQLite.
+    """
+
+    def __init__(self, quotes_path='data/daily_quote_data.parquet', db_path='data/stock_data.db'):
+        self.quotes_path = quotes_path
+        self.db_path = db_path
+
+    def read_quotes(self, after_date=None) -> DataFrame:
+        df = pd.read_parquet(self.quotes_path, columns=QUOTE_COLUMNS)
+        df['date'] = pd.to_datetime(df['date']).dt.date
+        if after_date is not None:
+            df = df[df['date'] > after_date]
+        return df
+
+    def read_state(self) -> DataFrame:
+        with sqlite3.connect(self.db_path) as connection:
+            exists = connection.execute(
+                "SELECT name FROM sqlite_master WHERE type='table' AND name='ewm_state'"
+            ).fetchone()
+            if not exists:
+                return pd.DataFrame()
+            df = pd.read_sql('SELECT * FROM ewm_state', connection)
+        df['date'] = pd.to_datetime(df['date']).dt.date
+        return df
+
+    def write_state(self, df: DataFrame):
+        self._write('ewm_state', df)
+
+    def write_selected(self, df: DataFrame):
+        self._write('selected_stocks', df)
+
+    def _write(self, table_id, df):
+        directory = os.path.dirname(self.db_path)
+        if directory and not os.path.exists(directory):
+            os.makedirs(directory)
+        with sqlite3.connect(self.db_path) as connection:
+            df.to_sql(table_id, connection, if_exists='replace', index=False)
+
+
+def get_store():
+    if STOCK_DATA_BACKEND == 'local':
+        return LocalStore()
+    return BigQueryStore()
@@ -1,51 +1,32 @@
-from google.cloud import bigquery
+import numpy as np
 import pandas as pd
+from pandas.core.frame import DataFrame
+from quote_store import QUOTE_COLUMNS, get_store
+
+# (average column, source column, span) kept as running exponential averages
+AVERAGES = [
+    ('averageDayChange50', 'dayChange', 50),
+    ('averageVolume50', 'totalVolume', 50),
+    ('averageVolume10', 'totalVolume', 10),
+]
 
 def select_stocks(event, context):
-    client = bigquery.Client()
+    store = get_store()
+
+    # Only load the rows that arrived since the last run
+    state = store.read_state()
+    last_date = state['date'].max() if len(state.index) > 0 else None
+    df = store.read_quotes(last_date)
+    print(f'Updating averages with {len(df.index)} new rows (last update: {last_date})')
+
+    state = update_state(state, df)
+    store.write_state(state)
+
+    # Most recent values for each stock
+    recent_df = state[QUOTE_COLUMNS + ['dayChange']].copy()
+    for average, _, _ in AVERAGES:
+        recent_df[average] = state[f'{average}_num'] / state[f'{average}_den']
 
-    # Load all the data in the table
-    sql_hist = """
-        SELECT date, symbol, closePrice, lowPrice, highPrice, totalVolume, volatility
-        FROM `splendid-cirrus-302501.stock_data.daily_quote_data`
-    """
-    df = client.query(sql_hist).to_dataframe()
-
-    # Sort by date ascending
-    df = df.sort_values(by='date').reset_index(drop=True)
-
-    # Calculate day change percent
-    dayChange = []
-    for i in df.index:
-        try:
-            high = df['highPrice'][i]
-            low = df['lowPrice'][i]
-            if low and low > 0:
-                dayChange.append(round(((high - low) / low) * 100, 2))
-            else:
-                dayChange.append(0)
-        except KeyError:
-            dayChange.append(0)
-    df['dayChange'] = dayChange
-
-
-    # Calculate averages
-    symbols = df['symbol'].unique()
-    symbol_data = {}
-    for symbol in symbols:
-        symbol_df = df[df['symbol'] == symbol]
-        symbol_df = symbol_df.set_index('date')
-        symbol_df['averageDayChange50'] = symbol_df['dayChange'].ewm(span=50).mean()
-        symbol_df['averageVolume50'] = symbol_df['totalVolume'].ewm(span=50).mean()
-        symbol_df['averageVolume10'] = symbol_df['totalVolume'].ewm(span=10).mean()
-        symbol_data[symbol] = symbol_df
-    
-    # Rebuild DataFrame with most recent values for each stock
-    recent_df = pd.DataFrame(columns=df.columns)
-    for symbol in symbols:
-        i = len(symbol_data[symbol].index) - 1
-        recent_df = recent_df.append(symbol_data[symbol].iloc[i])
-    
     # Filter stocks by high volatility criteria
     filtered_df = recent_df.query(
         'averageDayChange50>4.5 & averageVolume50>4000000 & averageVolume10>4000000 & closePrice>=5'
@@ -55,21 +36,59 @@ def select_stocks(event, context):
     sorted_df = filtered_df.sort_values('averageDayChange50', ascending=False)
 
     # Grab top 5 stocks
-    selected_stocks = sorted_df[:5]
-    selected_stocks['date'] = selected_stocks.index.values
+    selected_stocks = sorted_df[:5].reset_index(drop=True)
     print(selected_stocks)
 
-    dataset_id = 'stock_data'
-    table_id = 'selected_stocks'
+    store.write_selected(selected_stocks)
+    print('Success')
 
-    dataset_ref = client.dataset(dataset_id)
-    table_ref = dataset_ref.table(table_id)
+def update_state(state: DataFrame, df: DataFrame) -> DataFrame:
+    """
+    Folds new daily quotes into the per-symbol state table.
 
-    job_config = bigquery.LoadJobConfig()
-    job_config.autodetect = True
-    job_config.write_disposition = 'WRITE_TRUNCATE' # Always replace table data
-    job = client.load_table_from_dataframe(selected_stocks, table_ref, job_config=job_config)
-    job.result()
-    print('Success')
+    Each average is kept as the numerator and denominator of pandas'
+    adjusted ewm(span=...).mean(), so adding a day is
+    num = x + (1 - alpha) * num, den = 1 + (1 - alpha) * den
+    and the average is num / den, the same as recomputing it over the full history.
+    """
+    if len(state.index) == 0:
+        state = pd.DataFrame(columns=['symbol'] + [
+            f'{average}_{part}' for average, _, _ in AVERAGES for part in ['num', 'den']
+        ])
+    state = state.set_index('symbol')
+
+    df = df.sort_values(by='date', kind='mergesort')
+    df = df.assign(dayChange=_day_change(df))
+
+    # Each pass updates every symbol that has a row on that date
+    for date, day_df in df.groupby('date', sort=True):
+        day_df = day_df.drop_duplicates('symbol', keep='last').set_index('symbol')
+        new_symbols = day_df.index.difference(state.index)
+        if len(new_symbols) > 0:
+            state = pd.concat([state, pd.DataFrame(index=new_symbols)])
+        row_state = state.loc[day_df.index]
+
+        for average, column, span in AVERAGES:
+            decay = 1 - 2 / (span + 1)
+            num = row_state[f'{average}_num'].astype(float).fillna(0).values
+            den = row_state[f'{average}_den'].astype(float).fillna(0).values
+            x = day_df[column].values.astype(float)
+            # A missing value still ages the older ones (ignore_na=False)
+            present = ~np.isnan(x)
+            state.loc[day_df.index, f'{average}_num'] = decay * num + np.where(present, x, 0)
+            state.loc[day_df.index, f'{average}_den'] = decay * den + present
+
+        for column in day_df.columns:
+            state.loc[day_df.index, column] = day_df[column].values
+
+    state.index.name = 'symbol'
+    return state.reset_index()
+
+def _day_change(df: DataFrame):
+    high = df['highPrice'].values.astype(float)
+    low = df['lowPrice'].values.astype(float)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        change = np.round((high - low) / low * 100, 2)
+    return np.where(low > 0, change, 0)
 
 select_stocks(None, None)
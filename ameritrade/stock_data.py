@@ -1,5 +1,6 @@
 import os
 import csv
+import numpy as np
 import pandas as pd
 from pprint import pprint
 from alpha_vantage.timeseries import TimeSeries
@@ -8,8 +9,25 @@ from secrets import ALPHA_VANTAGE_TOKEN
 
 from pandas.core.frame import DataFrame
 
+COLUMNS = ['open', 'high', 'low', 'close', 'volume', 'OBV', 'OBV_EMA']
+
+# Loaded caches, so repeated lookups don't touch the disk again
+_stock_data = {}
+
 def get_stock_data(symbol, interval, slice='year1month1'):
-    file_path = f'data/{symbol}_{slice}_{interval}.csv'
+    data = _load_stock_data(symbol, interval, slice)
+    if data is None:
+        return None
+    return _to_frame(data, 0, len(data['time']))
+
+def _load_stock_data(symbol, interval, slice):
+    """
+    Returns the cached arrays for a symbol's slice: a sorted int64 'time'
+    index plus the OHLCV, OBV and OBV_EMA columns.
+    """
+    file_path = f'data/{symbol}_{slice}_{interval}.npz'
+    if file_path in _stock_data:
+        return _stock_data[file_path]
 
     # If the backup doesn't exist, go get it and store it locally
     if not os.path.exists(file_path):
@@ -17,54 +35,59 @@ def get_stock_data(symbol, interval, slice='year1month1'):
         if not os.path.exists('data'):
             os.mkdir('data')
 
-        # Retrieve CSV data from API and save it to local file
-        ts = TimeSeries(key=ALPHA_VANTAGE_TOKEN, output_format='csv')
-        with open(file_path, 'w') as new_file:
+        # Reuse an old CSV backup, or retrieve the CSV data from the API
+        csv_path = f'data/{symbol}_{slice}_{interval}.csv'
+        if os.path.exists(csv_path):
+            data = pd.read_csv(csv_path)
+        else:
+            ts = TimeSeries(key=ALPHA_VANTAGE_TOKEN, output_format='csv')
             reader, _ = ts.get_intraday_extended(symbol=symbol, interval=interval, slice=slice)
-            for row in reader:
-                new_file.write(','.join(row))
-                new_file.write('\n')
-        
-        # Load the newly created CSV and update it with calculated indicators
-        data = pd.read_csv(file_path)
+            rows = list(reader)
+            data = pd.DataFrame(rows[1:], columns=rows[0])
 
         # Check if data is not empty
         if len(data.index) > 0:
             data = data.set_index(pd.DatetimeIndex(data['time'].values))
             data = data.sort_index()
-            data = _calculate_obv_data(data)
-            data.to_csv(file_path)
+            data = _calculate_obv_data(data.astype({column: float for column in COLUMNS[:5]}))
+            np.savez(
+                file_path,
+                time=data.index.values.astype('int64'),
+                **{column: data[column].values.astype(float) for column in COLUMNS}
+            )
         else:
             return None
 
-    # Load the CSV file, sort it by the time, and return the specified date's data
-    data = pd.read_csv(file_path)
-    if len(data.index) > 0:
-        data = data.set_index(pd.DatetimeIndex(data['time'].values))
-        data = data.drop(columns=['time', 'Unnamed: 0'])
-        return data
-    else:
+    # Load the arrays once and keep them for later calls
+    with np.load(file_path) as cache:
+        data = {key: cache[key] for key in cache.files}
+    if len(data['time']) == 0:
         return None
+    _stock_data[file_path] = data
+    return data
 
-def _calculate_obv_data(df: DataFrame):
-    OBV = []
-    OBV.append(0)
+def _to_frame(data, start, end):
+    return pd.DataFrame(
+        {column: data[column][start:end] for column in COLUMNS},
+        index=pd.DatetimeIndex(data['time'][start:end].astype('datetime64[ns]'))
+    )
 
-    for i in range(1, len(df.close)):
-        if df.close[i] > df.close[i-1]:
-            OBV.append(OBV[-1] + df.volume[i])
-        elif df.close[i] < df.close[i-1]:
-            OBV.append(OBV[-1] - df.volume[i])
-        else:
-            OBV.append(OBV[-1])
-    
-    df['OBV'] = OBV
+def _calculate_obv_data(df: DataFrame):
+    # Add volume on up closes, subtract it on down closes
+    direction = np.sign(np.diff(df['close'].values))
+    df['OBV'] = np.concatenate([[0.0], np.cumsum(direction * df['volume'].values[1:])])
     df['OBV_EMA'] = df['OBV'].ewm(span=20).mean()
     return df
 
 def get_stock_data_on_date(symbol, interval, slice, date):
-    data = get_stock_data(symbol, interval, slice)
-    symbol_date_data = data[data.index.to_series().between(f'{date} 00:00:00', f'{date} 23:59:59')]
-    if len(symbol_date_data.index) > 0:
-        return symbol_date_data
-    return None
\ No newline at end of file
+    data = _load_stock_data(symbol, interval, slice)
+    if data is None:
+        return None
+    # Binary search the sorted timestamps for the day's bars
+    day_start = np.datetime64(f'{date}T00:00:00', 'ns').astype('int64')
+    day_end = day_start + np.timedelta64(1, 'D').astype('timedelta64[ns]').astype('int64')
+    start = data['time'].searchsorted(day_start, side='left')
+    end = data['time'].searchsorted(day_end, side='left')
+    if end > start:
+        return _to_frame(data, start, end)
+    return None
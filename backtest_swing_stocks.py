@@ -6,40 +6,44 @@ import sys
 import time
 from pytz import timezone
 from datetime import datetime
-from google.cloud import storage
+from alpaca_client import get_api
 import pandas as pd
 pd.set_option('mode.chained_assignment', None)
-from alpaca_trade_api import REST
 from select_historic_swing_stocks import select_swing_stocks
-
-# Get Alpaca API key and secret
-storage_client = storage.Client()
-bucket = storage_client.get_bucket('derek-algo-trading-bucket')
-blob = bucket.blob('alpaca-api-key.txt')
-api_key = blob.download_as_text()
-blob = bucket.blob('alpaca-secret-key.txt')
-secret_key = blob.download_as_text()
-base_url = 'https://paper-api.alpaca.markets'
-api = REST(api_key, secret_key, base_url, 'v2')
+from bar_store import BarStore
+from bar_panel import build_panel
+from pattern_index import PatternIndex
+from price_resolver import PriceResolver
+from trading_calendar import TradingCalendar
+from indicators.cache import get_cache
 
 nyc = timezone('America/New_York')
 
+def get_open_prices(date: datetime, symbols):
+    return dict(zip(symbols, prices.resolve(list(symbols), date, 'open')))
+
 def get_open_price(date: datetime, symbol: Text):
-    today = datetime.isoformat(pd.Timestamp(date))
-    bar = api.get_barset(symbol, '1D', start=today, end=today, limit=1).df
-    return bar[symbol]['open'][bar.index.max()]
+    return get_open_prices(date, [symbol])[symbol]
 
 def buy_stock(date: datetime, symbol: Text, qty: int):
     buy_price = get_open_price(date, symbol)
+    # No bar in the panel nor from the fallback download
+    if not math.isfinite(buy_price):
+        print(f'{symbol}: no open price on {date.strftime("%Y-%m-%d")}, not buying')
+        return False
     position_data[symbol] = {
         'qty': str(qty),
         'avg_entry_price': str(buy_price),
         'current_buy_price': str(buy_price),
         'market_value': str(round(buy_price * qty, 2))
     }
+    return True
 
 def sell_stock(date: datetime, symbol: Text):
     sell_price = get_open_price(date, symbol)
+    if not math.isfinite(sell_price):
+        print(f'{symbol}: no open price on {date.strftime("%Y-%m-%d")}, holding it')
+        return None
     entry_price = float(position_data[symbol]['avg_entry_price'])
     del position_data[symbol]
     assert symbol not in position_data.keys()
@@ -72,26 +76,37 @@ if start_date and end_date:
     # Create a list of dates in between start and end (inclusive)
     dates = pd.date_range(start=start_date, end=end_date, freq='B', tz=nyc)
 
+    # Download the history for the whole window once
+    # and let each day slice what it needs from the panel
+    api = get_api()
+    assets = api.list_assets('active')
+    symbols = [asset.symbol for asset in assets if asset.tradable]
+    bar_store = BarStore(api)
+    panel = build_panel(bar_store, symbols, dates[0], dates[-1])
+    prices = PriceResolver(panel, bar_store.fetcher)
+    # Each day's buy candidates come from the index of confirmed patterns,
+    # which only scans the sessions it has not seen before
+    pattern_index = PatternIndex().update_from_panel(panel)
+    calendar = TradingCalendar(api)
+
     # Trade each day
     for date in dates:
         print(f'------------------ {date.strftime("%Y-%m-%d")} ------------------')
 
         # Check if market is open on that date
-        calendar = api.get_calendar(
-            start=datetime.isoformat(pd.Timestamp(date)),
-            end=datetime.isoformat(pd.Timestamp(date))
-        )[0]
-        if calendar.date.strftime("%Y-%m-%d") != date.strftime("%Y-%m-%d"):
+        if not calendar.is_session(date):
             print('Market was not open')
-            print(calendar.date.strftime("%Y-%m-%d"))
-            print(date.strftime("%Y-%m-%d"))
             continue
 
         # Must update position prices before going into the day
         # Something that Alpaca handles for you
         if len(position_data.keys()) > 0:
+            current_open_prices = get_open_prices(date, position_data.keys())
             for symbol in position_data.keys():
-                current_open_price = get_open_price(date, symbol)
+                current_open_price = current_open_prices[symbol]
+                if not math.isfinite(current_open_price):
+                    # Keep the last known price
+                    continue
                 position_data[symbol]['current_price'] = str(current_open_price)
                 position_data[symbol]['market_value'] = str(round(
                     current_open_price * int(position_data[symbol]['qty']),
@@ -102,7 +117,9 @@ if start_date and end_date:
         buy_df, sell_df, hold_df = select_swing_stocks(
             date=date,
             position_data=position_data,
-            portfolio_amount=portfolio_amount
+            portfolio_amount=portfolio_amount,
+            panel=panel,
+            pattern_index=pattern_index
         )
 
         print(f'Buying: {len(buy_df)}')
@@ -116,6 +133,8 @@ if start_date and end_date:
             for symbol in sell_df.index:
                 # latest_price = sell_df['latest_price'][symbol]
                 gain = sell_stock(date, symbol)
+                if gain is None:
+                    continue
                 print('{}: {}{}%'.format(
                     symbol,
                     '+' if gain > 0 else '',
@@ -133,8 +152,8 @@ if start_date and end_date:
             for symbol in buy_df.index:
                 qty = buy_df['qty'][symbol]
                 price = buy_df['close'][symbol]
-                buy_stock(date, symbol, qty)
-                print(f'{symbol}: {qty}')
+                if buy_stock(date, symbol, qty):
+                    print(f'{symbol}: {qty}')
         
         print()
     
@@ -151,3 +170,4 @@ if start_date and end_date:
         else:
             print('None')
         print()
+    get_cache().print_stats()
@@ -0,0 +1,148 @@
+import random
+import statistics
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, List
+from pandas.core.frame import DataFrame
+from helpers import chunks
+
+# Alpaca allows 200 requests per minute per API key,
+# leave some room for the orders and account calls made alongside
+ALPACA_REQUESTS_PER_MINUTE = 180
+
+
+class TokenBucket:
+    """
+    Thread-safe token bucket that refills at `rate` tokens per second
+    and holds at most `capacity` tokens.
+    """
+
+    def __init__(self, rate, capacity):
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = capacity
+        self.updated = time.monotonic()
+        self.lock = threading.Lock()
+
+    def acquire(self):
+        """Blocks until a token is available and takes it."""
+        while True:
+            with self.lock:
+                now = time.monotonic()
+                self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+                self.updated = now
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+                wait = (1 - self.tokens) / self.rate
+            time.sleep(wait)
+
+
+class BarFetcher:
+    """
+    Requests Alpaca barsets for many symbols with several chunks in flight.
+
+    Every request goes through a shared token bucket tuned to the Alpaca
+    quota and is retried with jittered exponential backoff. The duration
+    and attempts of each chunk of the last call are kept in `timings`.
+    """
+
+    def __init__(self, api, max_workers=4, chunk_size=200, retries=3,
+                 requests_per_minute=ALPACA_REQUESTS_PER_MINUTE, burst=10):
+        self.api = api
+        self.max_workers = max_workers
+        self.chunk_size = chunk_size
+        self.retries = retries
+        self.limiter = TokenBucket(requests_per_minute / 60.0, burst)
+        self.timings = []
+
+    def get_barset(self, symbols: List[str], timeframe, **kwargs) -> Dict:
+        """
+        Returns the bars of each symbol, same as `api.get_barset(...)[symbol]`.
+        Keyword arguments are passed through to `api.get_barset`.
+        """
+        data = {}
+        for symbol_group, barset in self._fetch_all(symbols, self._barset_request(timeframe, kwargs)):
+            for symbol in symbol_group:
+                data[symbol] = barset[symbol]
+        return data
+
+    def get_barset_df(self, symbols: List[str], timeframe, **kwargs) -> Dict[str, DataFrame]:
+        """
+        Returns the bars of each symbol as a DataFrame, same as `api.get_barset(...).df[symbol]`.
+        Keyword arguments are passed through to `api.get_barset`.
+        """
+        data = {}
+        missing = []
+        for symbol_group, barset in self._fetch_all(symbols, self._barset_request(timeframe, kwargs)):
+            data_group = barset.df
+            returned = set(data_group.columns.get_level_values(0))
+            for symbol in symbol_group:
+                if symbol in returned:
+                    data[symbol] = data_group[symbol]
+                else:
+                    missing.append(symbol)
+        if missing:
+            print(f"No bars returned for {len(missing)} symbols: {', '.join(missing[:20])}"
+                  + (' ...' if len(missing) > 20 else ''))
+        return data
+
+    def get_last_prices(self, symbols: List[str]) -> Dict[str, float]:
+        """
+        Returns the latest trade price of each symbol from the multi-symbol
+        snapshot endpoint. Symbols without a trade are left out.
+        """
+        data = {}
+        for _, snapshots in self._fetch_all(symbols, self.api.get_snapshots):
+            for symbol, snapshot in snapshots.items():
+                if snapshot and snapshot.latest_trade:
+                    data[symbol] = snapshot.latest_trade.p
+        return data
+
+    def print_stats(self):
+        if not self.timings:
+            return
+        durations = [timing['seconds'] for timing in self.timings]
+        retried = len([timing for timing in self.timings if timing['attempts'] > 1])
+        print('{} chunks: avg {}s, max {}s, {} retried'.format(
+            len(durations),
+            '%.2f' % statistics.mean(durations),
+            '%.2f' % max(durations),
+            retried
+        ))
+
+    def _barset_request(self, timeframe, kwargs):
+        return lambda symbol_group: self.api.get_barset(','.join(symbol_group), timeframe, **kwargs)
+
+    def _fetch_all(self, symbols, request):
+        # Stats only cover the latest call
+        self.timings = []
+        symbols_chunked = list(chunks(list(dict.fromkeys(symbols)), self.chunk_size))
+        print(f'Retrieving {len(symbols_chunked)} chunks of symbol data...')
+        with ThreadPoolExecutor(max_workers=self.max_workers) as executor:
+            responses = executor.map(
+                lambda symbol_group: self._fetch(symbol_group, request),
+                symbols_chunked
+            )
+            return list(zip(symbols_chunked, responses))
+
+    def _fetch(self, symbol_group, request):
+        started = time.monotonic()
+        for attempt in range(1, self.retries + 2):
+            self.limiter.acquire()
+            try:
+                response = request(symbol_group)
+                break
+            except Exception as e:
+                if attempt > self.retries:
+                    raise
+                backoff = random.uniform(0, 2 ** attempt)
+                print(f'Error retrieving {len(symbol_group)} symbols, retrying in {round(backoff, 1)}s:', e)
+                time.sleep(backoff)
+        self.timings.append({
+            'symbols': len(symbol_group),
+            'seconds': time.monotonic() - started,
+            'attempts': attempt
+        })
+        return response
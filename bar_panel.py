@@ -0,0 +1,106 @@
+import os
+from datetime import datetime, timedelta
+from typing import List
+import numpy as np
+import pandas as pd
+from pandas.core.frame import DataFrame
+from bar_store import BAR_COLUMNS, BarStore
+
+# Where the prebuilt panel is written
+BAR_PANEL_DIR = os.environ.get('BAR_PANEL_DIR', 'data/panel')
+
+
+class BarPanel:
+    """
+    Memory-mapped float32 panel of daily bars with axes symbols × days × OHLCV.
+
+    Days a symbol did not trade are NaN. The panel is written once by
+    `build_panel` and then opened read-only, so slicing a symbol's history
+    up to a date is a view into the page cache rather than a download.
+    """
+
+    def __init__(self, path=BAR_PANEL_DIR):
+        index = np.load(os.path.join(path, 'index.npz'))
+        self.symbols = list(index['symbols'])
+        self.dates = pd.DatetimeIndex(index['dates']).tz_localize('UTC').tz_convert(str(index['tz']))
+        self.positions = {symbol: i for i, symbol in enumerate(self.symbols)}
+        self.data = np.memmap(
+            os.path.join(path, 'bars.f32'),
+            dtype=np.float32,
+            mode='r',
+            shape=(len(self.symbols), len(self.dates), len(BAR_COLUMNS))
+        )
+        # Running count of valid bars per symbol, to find where the last N bars start
+        self.counts = index['counts']
+
+    def __contains__(self, symbol):
+        return symbol in self.positions
+
+    def history(self, symbol, end, limit=1000) -> DataFrame:
+        """
+        Returns a view of the symbol's last `limit` bars up to and including `end`.
+        Rows the symbol did not trade in between are left as NaN.
+        """
+        i = self.positions[symbol]
+        j = self.dates.searchsorted(pd.Timestamp(end), side='right')
+        counts = self.counts[i]
+        start = counts.searchsorted(counts[j] - limit, side='left')
+        return pd.DataFrame(
+            self.data[i, start:j],
+            index=self.dates[start:j],
+            columns=BAR_COLUMNS,
+            copy=False
+        )
+
+
+def build_panel(store: BarStore, symbols: List[str], start: datetime, end: datetime,
+                path=BAR_PANEL_DIR, limit=1000) -> BarPanel:
+    """
+    Builds the panel from `limit` days before `start` through `end`.
+
+    :param store: bar store used to download any missing daily bars
+    :param symbols: symbols in the panel
+    :param start: first day that will be sliced from the panel
+    :param end: last day that will be sliced from the panel
+    """
+    symbols = sorted(set(symbols))
+
+    # History leading up to the first day
+    store.get_bars(symbols, '1D', limit=limit, end=datetime.isoformat(pd.Timestamp(start - timedelta(days=1))))
+    # Then the rest of the window, in steps well under `limit` bars per request
+    for window_end in list(pd.date_range(start, end, freq=f'{limit // 2}B')[1:]) + [pd.Timestamp(end)]:
+        store.get_bars(symbols, '1D', limit=limit, end=datetime.isoformat(window_end))
+
+    frames = {}
+    for symbol in symbols:
+        df = store.load(symbol, '1D')
+        if df is not None:
+            frames[symbol] = df
+    symbols = list(frames.keys())
+    dates = pd.DatetimeIndex(sorted(set().union(*[df.index for df in frames.values()])))
+
+    if not os.path.exists(path):
+        os.makedirs(path)
+    data = np.memmap(
+        os.path.join(path, 'bars.f32'),
+        dtype=np.float32,
+        mode='w+',
+        shape=(len(symbols), len(dates), len(BAR_COLUMNS))
+    )
+    data[:] = np.nan
+    counts = np.zeros((len(symbols), len(dates) + 1), dtype=np.int32)
+    for i, symbol in enumerate(symbols):
+        df = frames[symbol]
+        data[i, dates.get_indexer(df.index)] = df[BAR_COLUMNS].values
+        counts[i, 1:] = np.cumsum(~np.isnan(data[i, :, 3]))
+    data.flush()
+    del data
+
+    np.savez(
+        os.path.join(path, 'index.npz'),
+        symbols=np.array(symbols),
+        dates=dates.tz_convert('UTC').tz_localize(None).values,
+        tz=str(dates.tz),
+        counts=counts
+    )
+    return BarPanel(path)
@@ -0,0 +1,147 @@
+import os
+import json
+from datetime import datetime
+from typing import Dict, List
+import pandas as pd
+from pandas.core.frame import DataFrame
+from bar_fetcher import BarFetcher
+
+# Where the Parquet files live, one directory per timeframe
+BAR_STORE_DIR = os.environ.get('BAR_STORE_DIR', 'data/bars')
+
+BAR_COLUMNS = ['open', 'high', 'low', 'close', 'volume']
+
+# Set BAR_DTYPE=float32 to keep the bars (and the indicators computed from
+# them) in half the memory, see indicators/engine.py for the error bounds.
+# The files on disk are always float64
+BAR_DTYPE = os.environ.get('BAR_DTYPE', 'float64')
+
+
+class BarStore:
+    """
+    Local on-disk cache of Alpaca bars.
+
+    Bars are stored as one Parquet file per symbol under
+    ``<root>/<timeframe>/<symbol>.parquet``. Each request only downloads
+    the bars after the last stored timestamp, so a daily run pulls one
+    new bar per symbol instead of the full history. The first bar of the
+    symbols whose whole history is stored is kept in
+    ``<root>/<timeframe>/first_bars.json``, so they are not fetched again
+    for bars they do not have.
+    """
+
+    def __init__(self, api, root=BAR_STORE_DIR):
+        self.api = api
+        self.root = root
+        self.fetcher = BarFetcher(api)
+        # First bar of the symbols whose whole history was fetched, by timeframe
+        self.first_bars = {}
+
+    def get_bars(self, symbols: List[str], timeframe='1D', limit=1000, end=None) -> Dict[str, DataFrame]:
+        """
+        Returns the latest `limit` bars of each symbol, up to and including `end`.
+
+        :param symbols: symbols to retrieve
+        :param timeframe: Alpaca barset timeframe (e.g. '1D', '15Min')
+        :param limit: maximum number of bars per symbol
+        :param end: ISO timestamp of the last bar wanted, defaults to now
+        """
+        end_ts = pd.Timestamp(end) if end else None
+
+        # Group the symbols by the timestamp they need bars from
+        # so they can still be requested 200 at a time
+        stored = {}
+        starts = {}
+        for symbol in set(symbols):
+            df = self.load(symbol, timeframe)
+            stored[symbol] = df
+            if df is None or self._missing_history(symbol, timeframe, df, limit, end_ts):
+                # Not enough bars on disk before `end`, get the full history up to it
+                starts.setdefault(None, []).append(symbol)
+            elif end_ts is None or end_ts > df.index.max():
+                # Re-request the last stored bar in case it was still forming
+                starts.setdefault(df.index.max(), []).append(symbol)
+
+        first_bars = self._first_bars(timeframe)
+        found_first_bars = False
+        for start, start_symbols in starts.items():
+            fetched = self._fetch(start_symbols, timeframe, limit, start, end)
+            for symbol, df in fetched.items():
+                if start is None and len(df.index) < limit:
+                    # The symbol has no older bars than these
+                    first_bars[symbol] = df.index.min()
+                    found_first_bars = True
+                if stored[symbol] is not None:
+                    # Merge so the bars on disk outside the fetched range are kept
+                    df = pd.concat([stored[symbol], df])
+                    df = df[~df.index.duplicated(keep='last')].sort_index()
+                stored[symbol] = df
+                self.save(symbol, timeframe, df)
+        if found_first_bars:
+            self._save_first_bars(timeframe)
+
+        data = {}
+        for symbol in symbols:
+            df = stored.get(symbol)
+            if df is None:
+                df = pd.DataFrame(columns=BAR_COLUMNS)
+            elif end_ts is not None:
+                df = df[df.index <= end_ts]
+            data[symbol] = df.tail(limit).astype(BAR_DTYPE)
+        return data
+
+    def load(self, symbol, timeframe):
+        path = self._path(symbol, timeframe)
+        if not os.path.exists(path):
+            return None
+        df = pd.read_parquet(path)
+        return df[BAR_COLUMNS].astype('float64') if len(df.index) > 0 else None
+
+    def save(self, symbol, timeframe, df: DataFrame):
+        directory = os.path.join(self.root, timeframe)
+        if not os.path.exists(directory):
+            os.makedirs(directory)
+        df[BAR_COLUMNS].to_parquet(self._path(symbol, timeframe))
+
+    def _missing_history(self, symbol, timeframe, df: DataFrame, limit, end_ts):
+        # Whether fewer than `limit` stored bars come before `end_ts`
+        # and the symbol may have older ones
+        count = len(df.index) if end_ts is None else df.index.searchsorted(end_ts, side='right')
+        if count >= limit:
+            return False
+        first_bar = self._first_bars(timeframe).get(symbol)
+        return first_bar is None or first_bar < df.index.min()
+
+    def _first_bars(self, timeframe):
+        if timeframe not in self.first_bars:
+            first_bars = {}
+            path = os.path.join(self.root, timeframe, 'first_bars.json')
+            if os.path.exists(path):
+                with open(path) as f:
+                    first_bars = {symbol: pd.Timestamp(date) for symbol, date in json.load(f).items()}
+            self.first_bars[timeframe] = first_bars
+        return self.first_bars[timeframe]
+
+    def _save_first_bars(self, timeframe):
+        directory = os.path.join(self.root, timeframe)
+        if not os.path.exists(directory):
+            os.makedirs(directory)
+        path = os.path.join(directory, 'first_bars.json')
+        # Write then rename so an interrupted run never leaves a broken file
+        with open(path + '.tmp', 'w') as f:
+            json.dump({symbol: date.isoformat() for symbol, date in self.first_bars[timeframe].items()}, f)
+        os.replace(path + '.tmp', path)
+
+    def _path(self, symbol, timeframe):
+        return os.path.join(self.root, timeframe, f'{symbol}.parquet')
+
+    def _fetch(self, symbols, timeframe, limit, start, end):
+        start = datetime.isoformat(start) if start is not None else None
+        data = {}
+        fetched = self.fetcher.get_barset_df(symbols, timeframe, limit=limit, start=start, end=end)
+        for symbol, df in fetched.items():
+            df = df.loc[df['close'] > 0]
+            if len(df.index) > 0:
+                data[symbol] = df[BAR_COLUMNS].astype('float64')
+        self.fetcher.print_stats()
+        return data
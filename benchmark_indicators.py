@@ -0,0 +1,210 @@
+"""
+Offline micro-benchmarks of every indicator implementation used in the repo.
+
+Each indicator is run through btalib, ta, pandas, the in-house vectorized
+engine and the streaming (one bar at a time) versions on synthetic OHLCV,
+and the throughput, peak memory and deviation from the reference
+implementation are printed as a table.
+
+    python benchmark_indicators.py
+    python benchmark_indicators.py --sizes 1x100000,10000x1000 --repeat 3 --loop-symbols 100
+
+Implementations that work one symbol at a time only run on the first
+`--loop-symbols` symbols of a size; their throughput is still per bar so it
+compares directly with the vectorized kernels. Libraries that are not
+installed are skipped.
+"""
+import argparse
+import time
+import tracemalloc
+import warnings
+import numpy as np
+import pandas as pd
+from indicators import engine
+from indicators.streaming import MACDBank, StreamingEMA, StreamingOBV
+
+try:
+    from btalib.indicators.cci import cci as btalib_cci
+    from btalib.indicators.obv import obv as btalib_obv
+    from btalib.indicators.rsi import rsi as btalib_rsi
+except ImportError:
+    btalib_cci = btalib_obv = btalib_rsi = None
+
+try:
+    import ta
+except ImportError:
+    ta = None
+
+
+def synthetic_bars(symbols, bars, seed=0):
+    """Random-walk OHLCV arrays shaped (symbols, bars), with prices in cents."""
+    rng = np.random.default_rng(seed)
+    start = rng.uniform(2, 500, (symbols, 1))
+    close = np.round(start * np.exp(np.cumsum(rng.normal(0, 0.02, (symbols, bars)), axis=1)), 2)
+    open_ = np.round(close * (1 + rng.normal(0, 0.005, (symbols, bars))), 2)
+    high = np.round(np.maximum(open_, close) * (1 + rng.uniform(0, 0.02, (symbols, bars))), 2)
+    low = np.round(np.minimum(open_, close) * (1 - rng.uniform(0, 0.02, (symbols, bars))), 2)
+    volume = np.round(rng.lognormal(13, 1.5, (symbols, bars)))
+    return {'open': open_, 'high': high, 'low': low, 'close': close, 'volume': volume}
+
+
+def per_symbol(compute):
+    """Runs a one-symbol implementation over each row, given the row as a DataFrame."""
+    def run(bars):
+        rows = []
+        for i in range(bars['close'].shape[0]):
+            df = pd.DataFrame(
+                {column: values[i] for column, values in bars.items()},
+                index=pd.date_range('2000-01-03', periods=bars['close'].shape[1], freq='min')
+            )
+            rows.append(np.asarray(compute(df), dtype=float))
+        return np.vstack(rows)
+    return run
+
+
+def obv_loop(df):
+    # The original hand-rolled loop from ameritrade/stock_data
+    obv = [0]
+    for i in range(1, len(df.close)):
+        if df.close[i] > df.close[i - 1]:
+            obv.append(obv[-1] + df.volume[i])
+        elif df.close[i] < df.close[i - 1]:
+            obv.append(obv[-1] - df.volume[i])
+        else:
+            obv.append(obv[-1])
+    return [np.nan] + obv[1:]
+
+
+def obv_streaming(df):
+    obv = StreamingOBV()
+    return [obv.update(close, volume) for close, volume in zip(df['close'].values, df['volume'].values)]
+
+
+def ema_streaming(df):
+    ema = StreamingEMA(span=20)
+    return [ema.update(close) for close in df['close'].values]
+
+
+def macd_streaming(df):
+    bank = MACDBank([(12, 26, 9)], history=1)
+    values = []
+    for close in df['close'].values:
+        bank.update(close)
+        values.append(bank.macd(12, 26)[-1])
+    return values
+
+
+# indicator -> [(implementation, function of the OHLCV dict, works one symbol at a time)]
+# The first implementation of each indicator is the reference the others are compared to
+IMPLEMENTATIONS = {
+    'OBV': [
+        ('btalib', per_symbol(lambda df: btalib_obv(df).df['obv'].values), True),
+        ('python loop', per_symbol(obv_loop), True),
+        ('ta', per_symbol(lambda df: ta.volume.on_balance_volume(df['close'], df['volume'])), True),
+        ('streaming', per_symbol(obv_streaming), True),
+        ('engine', lambda bars: engine.obv(bars['close'], bars['volume']), False),
+    ],
+    'EMA(20)': [
+        ('pandas', per_symbol(lambda df: df['close'].ewm(span=20).mean()), True),
+        ('streaming', per_symbol(ema_streaming), True),
+        ('engine', lambda bars: engine.ewm(bars['close'], span=20), False),
+    ],
+    'RSI(14)': [
+        ('btalib', per_symbol(lambda df: btalib_rsi(df).df['rsi'].values), True),
+        ('ta', per_symbol(lambda df: ta.momentum.rsi(df['close'], window=14)), True),
+        ('engine', lambda bars: engine.rsi(bars['close']), False),
+    ],
+    'CCI(20)': [
+        ('btalib', per_symbol(lambda df: btalib_cci(df).df['cci'].values), True),
+        ('ta', per_symbol(lambda df: ta.trend.cci(df['high'], df['low'], df['close'], window=20)), True),
+        ('engine', lambda bars: engine.cci(bars['high'], bars['low'], bars['close']), False),
+    ],
+    'MACD(12,26)': [
+        ('ta', per_symbol(lambda df: ta.trend.macd(df['close'])), True),
+        ('streaming', per_symbol(macd_streaming), True),
+        ('engine', lambda bars: engine.macd(bars['close'])[0], False),
+    ],
+}
+
+# Implementations that need a library which may not be installed
+REQUIREMENTS = {'btalib': btalib_obv, 'ta': ta}
+
+
+def measure(compute, bars, repeat):
+    """Returns (best seconds, peak traced bytes, result) over `repeat` runs."""
+    best = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = compute(bars)
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    # Memory is traced in a separate run, tracing slows the Python-level loops down
+    tracemalloc.start()
+    compute(bars)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return best, peak, result
+
+
+def deviation(values, reference):
+    """Largest absolute difference where both are finite, and the number of NaN mismatches."""
+    both = np.isfinite(values) & np.isfinite(reference)
+    largest = np.abs(values[both] - reference[both]).max() if both.any() else np.nan
+    return largest, int((np.isnan(values) != np.isnan(reference)).sum())
+
+
+def run(sizes, repeat, loop_symbols, indicators=None):
+    print(f"{'indicator':<12} {'size':<12} {'implementation':<14} {'symbols':>7} "
+          f"{'Mbars/s':>9} {'peak MB':>9} {'max dev':>10} {'NaN diff':>8}")
+    for symbols, bars in sizes:
+        size = f'{symbols}x{bars}'
+        data = synthetic_bars(symbols, bars)
+        loop_data = {column: values[:loop_symbols] for column, values in data.items()}
+        for indicator, implementations in IMPLEMENTATIONS.items():
+            if indicators is not None and indicator.split('(')[0].lower() not in indicators:
+                continue
+            reference = None
+            for name, compute, looped in implementations:
+                if name in REQUIREMENTS and REQUIREMENTS[name] is None:
+                    print(f'{indicator:<12} {size:<12} {name:<14} skipped, not installed')
+                    continue
+                inputs = loop_data if looped else data
+                rows = inputs['close'].shape[0]
+                seconds, peak, result = measure(compute, inputs, repeat)
+                result = np.asarray(result, dtype=float)
+                # Compare on the rows every implementation computed
+                if reference is None:
+                    reference = result[:loop_symbols]
+                largest, nan_mismatches = deviation(result[:len(reference)], reference)
+                print(f'{indicator:<12} {size:<12} {name:<14} {rows:>7} '
+                      f'{rows * bars / seconds / 1e6:>9.3f} {peak / 1e6:>9.1f} '
+                      f'{largest:>10.2e} {nan_mismatches:>8}')
+        print()
+
+
+def parse_sizes(text):
+    sizes = []
+    for size in text.split(','):
+        symbols, bars = size.lower().split('x')
+        sizes.append((int(symbols), int(bars)))
+    return sizes
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Benchmark the indicator implementations on synthetic bars.')
+    parser.add_argument('--sizes', default='1x100000,10000x1000',
+                        help='comma separated SYMBOLSxBARS sizes (default: 1x100000,10000x1000)')
+    parser.add_argument('--repeat', type=int, default=3, help='timed runs per implementation, the best is kept')
+    parser.add_argument('--loop-symbols', type=int, default=100,
+                        help='symbols given to the one-symbol-at-a-time implementations')
+    parser.add_argument('--indicators', help='comma separated subset, e.g. obv,rsi')
+    args = parser.parse_args()
+
+    # btalib and ta still call pandas APIs that warn on every symbol
+    warnings.simplefilter('ignore', FutureWarning)
+    run(
+        parse_sizes(args.sizes),
+        args.repeat,
+        args.loop_symbols,
+        args.indicators.lower().split(',') if args.indicators else None
+    )
@@ -1,20 +1,76 @@
-import statistics as stats
-import pandas as pd
+import numpy as np
+from pandas.core.frame import DataFrame
 from pandas.core.series import Series
 
 class Candle:
+    __slots__ = ('open', 'high', 'low', 'close', 'is_bearish', 'is_bullish', 'body', 'body_center')
+
     def __init__(self, series: Series):
-        self.open = float(series['open'])
-        self.high = float(series['high'])
-        self.low = float(series['low'])
-        self.close = float(series['close'])
+        self._set(series['open'], series['high'], series['low'], series['close'])
+
+    @classmethod
+    def from_values(cls, open, high, low, close):
+        candle = cls.__new__(cls)
+        candle._set(open, high, low, close)
+        return candle
+
+    def _set(self, open, high, low, close):
+        self.open = float(open)
+        self.high = float(high)
+        self.low = float(low)
+        self.close = float(close)
         self.is_bearish = self.close < self.open
         self.is_bullish = self.close > self.open
+        self.body = abs(self.close - self.open)
+        self.body_center = (self.open + self.close) / 2
 
     def get_body(self):
-        return self.close - self.open if self.is_bullish \
-                else self.open - self.close
+        return self.body
 
     def get_body_center(self):
-        return stats.median([self.open, self.close])
-    
\ No newline at end of file
+        return self.body_center
+
+
+class CandleArray:
+    """
+    Many candles as contiguous float arrays of open, high, low and close,
+    with their bodies, body centers and direction computed once for all of them.
+
+    The arrays can be 1-D (days) or 2-D (symbols, days). Indexing a single
+    candle returns a Candle, any other index returns a CandleArray viewing
+    the same arrays, so shifting a panel by a day copies nothing.
+    """
+    FIELDS = ('open', 'high', 'low', 'close', 'is_bearish', 'is_bullish', 'body', 'body_center')
+
+    def __init__(self, open, high, low, close):
+        # float32 prices stay float32, anything else becomes float64
+        self.open, self.high, self.low, self.close = [
+            np.ascontiguousarray(values, dtype=_float_dtype(values)) for values in (open, high, low, close)
+        ]
+        self.is_bearish = self.close < self.open
+        self.is_bullish = self.close > self.open
+        self.body = np.abs(self.close - self.open)
+        self.body_center = (self.open + self.close) / 2
+
+    @classmethod
+    def from_frame(cls, df: DataFrame):
+        return cls(df['open'].values, df['high'].values, df['low'].values, df['close'].values)
+
+    @property
+    def shape(self):
+        return self.close.shape
+
+    def __len__(self):
+        return len(self.close)
+
+    def __getitem__(self, index):
+        if np.ndim(self.close[index]) == 0:
+            return Candle.from_values(self.open[index], self.high[index], self.low[index], self.close[index])
+        candles = CandleArray.__new__(CandleArray)
+        for field in self.FIELDS:
+            setattr(candles, field, getattr(self, field)[index])
+        return candles
+
+
+def _float_dtype(values):
+    return np.float32 if np.asarray(values).dtype == np.float32 else np.float64
@@ -0,0 +1,77 @@
+import json
+import os
+import time
+
+BUCKET_NAME = 'derek-algo-trading-bucket'
+
+# Optional on-disk cache of downloaded secrets, e.g. /tmp/credentials.json
+CREDENTIALS_CACHE = os.environ.get('CREDENTIALS_CACHE')
+CREDENTIALS_TTL = int(os.environ.get('CREDENTIALS_TTL', 24 * 60 * 60))
+
+# Optional local directory with one file per secret, named like the bucket blobs
+CREDENTIALS_DIR = os.environ.get('CREDENTIALS_DIR')
+
+_secrets = {}
+
+
+def get_secret(blob_name):
+    """
+    Returns a secret stored in the GCS bucket, e.g. 'alpaca-api-key.txt'.
+
+    Looked up in order from:
+      - the in-process cache
+      - an environment variable named after the blob ('ALPACA_API_KEY')
+      - a file with the blob's name in CREDENTIALS_DIR
+      - the CREDENTIALS_CACHE file, if younger than CREDENTIALS_TTL seconds
+      - the bucket itself, which then fills the caches
+    """
+    if blob_name in _secrets:
+        return _secrets[blob_name]
+
+    env_name = blob_name.replace('.txt', '').replace('-', '_').upper()
+    if os.environ.get(env_name):
+        secret = os.environ[env_name]
+    elif CREDENTIALS_DIR and os.path.exists(os.path.join(CREDENTIALS_DIR, blob_name)):
+        with open(os.path.join(CREDENTIALS_DIR, blob_name)) as secret_file:
+            secret = secret_file.read().strip()
+    else:
+        secret = _read_cache(blob_name)
+        if secret is None:
+            secret = _download(blob_name)
+            _write_cache(blob_name, secret)
+
+    _secrets[blob_name] = secret
+    return secret
+
+
+def _download(blob_name):
+    # Imported here so runs with local credentials never load the GCS client
+    from google.cloud import storage
+    storage_client = storage.Client()
+    bucket = storage_client.get_bucket(BUCKET_NAME)
+    return bucket.blob(blob_name).download_as_text()
+
+
+def _read_cache(blob_name):
+    if not CREDENTIALS_CACHE or not os.path.exists(CREDENTIALS_CACHE):
+        return None
+    with open(CREDENTIALS_CACHE) as cache_file:
+        cache = json.load(cache_file)
+    entry = cache.get(blob_name)
+    if entry and time.time() - entry['time'] < CREDENTIALS_TTL:
+        return entry['value']
+    return None
+
+
+def _write_cache(blob_name, secret):
+    if not CREDENTIALS_CACHE:
+        return
+    cache = {}
+    if os.path.exists(CREDENTIALS_CACHE):
+        with open(CREDENTIALS_CACHE) as cache_file:
+            cache = json.load(cache_file)
+    cache[blob_name] = {'value': secret, 'time': time.time()}
+    # Only readable by the current user
+    fd = os.open(CREDENTIALS_CACHE, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600)
+    with os.fdopen(fd, 'w') as cache_file:
+        json.dump(cache, cache_file)
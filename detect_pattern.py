@@ -1,44 +1,38 @@
-from btalib.indicators.obv import obv
+import numpy as np
 import pandas as pd
 from pandas.core.frame import DataFrame
-from candle import Candle
-from ta.volume import OnBalanceVolumeIndicator, on_balance_volume
+from candle import Candle, CandleArray
+from indicators import engine
+import pattern_registry as registry
 
-def detect_bullish_patterns(df: DataFrame):
+# Pattern names by the codes scan_bullish_patterns returns, in order of precedence
+BULLISH_PATTERNS = [''] + registry.names('bullish')
+
+def detect_bullish_patterns(df: DataFrame, obv_crossed=None):
     """
-    Finds all bullish candlestick patterns in a DataFrame with daily candlesticks.
+    Finds the first registered bullish candlestick pattern ending on the last day of a DataFrame with daily candlesticks.
 
     :param df: DataFrame with 3 days of candlestick data
+    :param obv_crossed: whether the OBV crossed above its EMA on the last day,
+        computed from `df` when not given (see indicators.engine.obv_cross_up)
     """
     assert type(df) == DataFrame
     assert len(df) >= 3
     
     symbol = df['symbol'][0]
 
-    recent_candle1 = Candle(df.iloc[len(df) - 3])
-    recent_candle2 = Candle(df.iloc[len(df) - 2])
-    recent_candle3 = Candle(df.iloc[len(df) - 1])
-
-    pattern = ''
-
-    # Search for each type of pattern
-    if is_bullish_engulfing(recent_candle1, recent_candle2, recent_candle3):
-        pattern = 'bullish_engulfing'
-    elif is_three_white_knights(recent_candle1, recent_candle2, recent_candle3):
-        pattern = 'three_white_knights'
-    elif is_morning_star(recent_candle1, recent_candle2, recent_candle3):
-        pattern = 'morning_star'
+    # Search for every registered pattern at once
+    recent_candles = CandleArray.from_frame(df.iloc[len(df) - 3:])
+    found = registry.matched(registry.scan(recent_candles)[-1], 'bullish')
+    pattern = found[0] if found else ''
     
     # Confirm a bullish candlestick pattern with a bullish OBV
     # To prove it's not a false-positive
     if pattern != '':
-        obv_df = obv(df).df
-        obv_df['obv_ema'] = obv_df['obv'].ewm(span=20).mean()
-        
         # Check to see if the OBV crossed above the EMA signal
-        recent_obv_df = pd.DataFrame(obv_df.tail(2))
-        if recent_obv_df['obv'][0] <= recent_obv_df['obv_ema'][0] \
-            and recent_obv_df['obv'][1] > recent_obv_df['obv_ema'][1]:
+        if obv_crossed is None:
+            obv_crossed = engine.obv_cross_up(df['close'].values[None, :], df['volume'].values[None, :])[0]
+        if obv_crossed:
             # print(f'{symbol} crossed the OBV EMA today')
             return pattern
 
@@ -54,19 +48,7 @@ def is_bullish_engulfing(
     Determines if the candles match a Bullish Engulfing candlestick pattern.
     Also checks for the long position entry requirement.
     """
-
-    # Check for a red then green candle
-    if first_candle.is_bearish and second_candle.is_bullish:
-        
-        # Check if green candle body engulfs the red candle
-        if second_candle.close > first_candle.open \
-            and second_candle.open < first_candle.close:
-            
-            # Check if the 3rd candle went higher than the green candle
-            if third_candle.high > second_candle.high:
-                return True
-    
-    return False
+    return _matches('bullish_engulfing', first_candle, second_candle, third_candle)
 
 
 def is_three_white_knights(
@@ -77,16 +59,7 @@ def is_three_white_knights(
     """
     Determines if the candles match a Three White Knights bullish candlestick pattern.
     """
-
-    # First check for all green candles
-    if first_candle.is_bullish and second_candle.is_bullish and third_candle.is_bullish:
-
-        # Check that all open and closing prices increase every day
-        if third_candle.open > second_candle.open > first_candle.open \
-            and third_candle.close > second_candle.close > first_candle.close:
-                return True
-    
-    return False
+    return _matches('three_white_knights', first_candle, second_candle, third_candle)
 
 def is_morning_star(
     first_candle: Candle,
@@ -96,23 +69,39 @@ def is_morning_star(
     """
     Determines if the candles match a Morning Star bullish candlestick pattern.
     """
+    return _matches('morning_star', first_candle, second_candle, third_candle)
 
-    # First check if the first is red and the third is green
-    if first_candle.is_bearish and third_candle.is_bullish:
-
-        # Make sure the second candle's body does not overlap the first or third
-        if second_candle.close < first_candle.close and second_candle.open < first_candle.close \
-            and second_candle.close < third_candle.open and second_candle.open < third_candle.open:
 
-            # Then check if the second candle's body is much smaller than the first
-            if (second_candle.get_body() / first_candle.get_body()) < 0.3:
+def _matches(name, *candles: Candle):
+    # Evaluates only the named rule of pattern_registry on these candles
+    offsets = {-k: candle for k, candle in zip(range(len(candles), 0, -1), candles)}
+    return registry.matches(registry.get(name), offsets)
 
-                # Check if the third's body is also long (at least 60% of its size)
-                if (third_candle.get_body() / first_candle.get_body()) >= 0.6:
 
-                    # Finally check that the third candle overlaps the first
-                    third_center = third_candle.get_body_center()
-                    if third_center > (first_candle.close * 1.05) and third_center < (first_candle.open * 0.95):
-                        return True
-        
-    return False
+def scan_bullish_patterns(open, high, low, close, volume=None, obv_crossed=None, span=20) -> np.ndarray:
+    """
+    Finds the bullish candlestick patterns of every symbol on every day at once.
+
+    Takes (symbols, days) arrays, oldest day first, and returns an int8 array of
+    the same shape with the index in BULLISH_PATTERNS of the pattern ending on
+    each day (0 for none), with the same checks and precedence as
+    detect_bullish_patterns. Patterns are only kept on days the OBV crossed above
+    its EMA, which is computed over each row from `volume` unless `obv_crossed`
+    gives it (a boolean array that broadcasts against the days).
+    """
+    candles = CandleArray(open, high, low, close)
+    masks = registry.scan(candles)
+
+    # Earlier patterns take precedence over later ones
+    codes = np.zeros(candles.shape, dtype=np.int8)
+    for code in range(len(BULLISH_PATTERNS) - 1, 0, -1):
+        codes[(masks & registry.bit(BULLISH_PATTERNS[code])) != 0] = code
+
+    # Confirm with the OBV crossing above its EMA on the same day
+    if obv_crossed is None:
+        obv = engine.obv(candles.close, volume)
+        obv_ema = engine.ewm(obv, span=span)
+        obv_crossed = np.zeros(candles.shape, dtype=bool)
+        obv_crossed[:, 1:] = (obv[:, :-1] <= obv_ema[:, :-1]) & (obv[:, 1:] > obv_ema[:, 1:])
+    codes[~np.broadcast_to(obv_crossed, codes.shape)] = 0
+    return codes
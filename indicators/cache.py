@@ -0,0 +1,166 @@
+"""
+Memoization of indicator series between screening runs and backtest days.
+
+A series is identified by the symbol, the timeframe, the span of bars it was
+computed from (first and last bar timestamp and the number of bars), a digest
+of the bar values it read and their dtype, the indicator name and its
+parameters. The digest is taken from the arrays the indicator is computed
+from, which the caller stacks anyway, so caching only pays off for
+indicators that take longer to compute than hashing their bars.
+That key is hashed into a digest, so the same bars always map to the same
+entry, and a new bar or a corrected one (e.g. a bar that was still forming)
+always misses.
+
+Entries live in an in-memory LRU bounded by their total size in bytes and,
+when a directory is given, also as .npy files on disk so later runs and
+overlapping backtest windows can reuse them.
+"""
+import os
+import hashlib
+from collections import OrderedDict
+import numpy as np
+
+# Set INDICATOR_CACHE_DIR to also keep the series on disk
+INDICATOR_CACHE_DIR = os.environ.get('INDICATOR_CACHE_DIR')
+INDICATOR_CACHE_BYTES = int(os.environ.get('INDICATOR_CACHE_BYTES', 256 * 1024 * 1024))
+
+
+class IndicatorCache:
+    """
+    LRU cache of indicator arrays with an optional on-disk tier.
+
+    Counts memory hits, disk hits and misses, see `stats()`.
+    """
+
+    def __init__(self, max_bytes=INDICATOR_CACHE_BYTES, root=INDICATOR_CACHE_DIR):
+        self.max_bytes = max_bytes
+        self.root = root
+        self.entries = OrderedDict()
+        self.size = 0
+        self.hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+
+    def keys(self, symbols, timeframe, indexes, columns, indicator, params=()):
+        """
+        Digests of many series' identities in one pass over the stacked bars.
+
+        `indexes` are the bar timestamps of each symbol and `columns` the
+        (symbols, length) arrays the indicator reads, as built by engine.stack,
+        with each symbol's bars right-aligned in its row. Only a symbol's own
+        bars are hashed, so the key does not depend on the other symbols.
+        """
+        dtypes = tuple(str(values.dtype) for values in columns)
+        keys = []
+        for row, (symbol, index) in enumerate(zip(symbols, indexes)):
+            # Raw datetime64 values, boxing them into Timestamps costs more than the hashing
+            timestamps = index.values
+            if len(timestamps) > 0:
+                bars = (str(timestamps[0]), str(timestamps[-1]), len(timestamps))
+            else:
+                bars = (None, None, 0)
+            digest = hashlib.sha1()
+            for values in columns:
+                digest.update(np.ascontiguousarray(values[row, values.shape[1] - len(timestamps):]))
+            identity = repr((symbol, timeframe, bars, dtypes, digest.hexdigest(), indicator, tuple(params)))
+            keys.append(hashlib.sha1(identity.encode()).hexdigest())
+        return keys
+
+    def get(self, key):
+        """Returns the cached array or None."""
+        if key in self.entries:
+            self.entries.move_to_end(key)
+            self.hits += 1
+            return self.entries[key]
+        path = self._path(key)
+        if path and os.path.exists(path):
+            try:
+                value = np.load(path, allow_pickle=False)
+            except (OSError, ValueError) as ex:
+                print(f'Could not read cached indicator {path}: {ex}')
+            else:
+                self.disk_hits += 1
+                self._remember(key, value)
+                return value
+        self.misses += 1
+        return None
+
+    def put(self, key, value):
+        value = np.asarray(value)
+        self._remember(key, value)
+        path = self._path(key)
+        if path:
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            # Write then rename so a reader never sees half a file
+            tmp_path = f'{path}.{os.getpid()}.tmp'
+            with open(tmp_path, 'wb') as f:
+                np.save(f, value, allow_pickle=False)
+            os.replace(tmp_path, path)
+        return value
+
+    def get_or_compute(self, key, compute):
+        """Returns the cached array, or computes, stores and returns it."""
+        value = self.get(key)
+        if value is None:
+            value = self.put(key, compute())
+        return value
+
+    def rows(self, keys, compute_rows):
+        """
+        Cached values for many symbols at once.
+
+        `compute_rows(missing)` gets the positions of the keys that were not
+        cached and returns one value per position, so the misses can still be
+        computed together in one vectorized pass.
+        """
+        values = [self.get(key) for key in keys]
+        missing = [i for i, value in enumerate(values) if value is None]
+        if missing:
+            for i, value in zip(missing, compute_rows(missing)):
+                values[i] = self.put(keys[i], value)
+        return values
+
+    def stats(self):
+        lookups = self.hits + self.disk_hits + self.misses
+        return {
+            'hits': self.hits,
+            'disk_hits': self.disk_hits,
+            'misses': self.misses,
+            'hit_rate': (self.hits + self.disk_hits) / lookups if lookups else 0.0,
+            'entries': len(self.entries),
+            'bytes': self.size
+        }
+
+    def print_stats(self):
+        stats = self.stats()
+        print('Indicator cache: {} hits, {} disk hits, {} misses ({:.0%} hit rate), {} entries, {:.1f} MB'.format(
+            stats['hits'], stats['disk_hits'], stats['misses'], stats['hit_rate'],
+            stats['entries'], stats['bytes'] / 1024 / 1024
+        ))
+
+    def _remember(self, key, value):
+        if key in self.entries:
+            self.size -= self.entries.pop(key).nbytes
+        if value.nbytes > self.max_bytes:
+            return
+        self.entries[key] = value
+        self.size += value.nbytes
+        # Evict the least recently used entries until it fits
+        while self.size > self.max_bytes:
+            _, evicted = self.entries.popitem(last=False)
+            self.size -= evicted.nbytes
+
+    def _path(self, key):
+        if not self.root:
+            return None
+        return os.path.join(self.root, key[:2], f'{key}.npy')
+
+
+_cache = None
+
+def get_cache() -> IndicatorCache:
+    """The cache shared by everything running in this process."""
+    global _cache
+    if _cache is None:
+        _cache = IndicatorCache()
+    return _cache
@@ -1,3 +1,5 @@
+import numpy as np
+
 
 def cci_check(cci, prev_cci, position):
     # Checking < -100 or > 100
@@ -35,3 +37,17 @@ def cci_check(cci, prev_cci, position):
         # else:
         #     Buy.append(np.NaN)
         #     Sell.append(np.NaN)
+
+def cci_signals(cci, prev_cci, position):
+    """
+    Array version of cci_check. Takes whole series of CCI values, the previous
+    values and whether a position is held (a mask or a single bool), and returns
+    the (buy, sell) masks where cci_check would return 'Buy' or 'Sell'.
+    """
+    cci, prev_cci = np.asarray(cci, dtype=float), np.asarray(prev_cci, dtype=float)
+    holding = np.asarray(position, dtype=bool)
+    # Same truthiness as the scalar check: 0 is falsy, NaN is not
+    checked = (cci != 0) & (prev_cci != 0)
+    buy = checked & ~holding & (cci < -100) & (prev_cci < -100)
+    sell = checked & holding & (cci > 100) & (prev_cci > 100)
+    return buy, sell
@@ -0,0 +1,256 @@
+"""
+Indicators for a whole universe of symbols at once.
+
+Every function takes 2-D float arrays shaped (symbols, bars), oldest bar
+first, and returns arrays of the same shape. Rows may start with NaN when a
+symbol has less history than the others (see `stack`). The results follow
+the definitions of the libraries used elsewhere in the repo:
+OBV, RSI and CCI match btalib, `ewm` matches pandas' ewm().mean() and
+`macd` matches ta.trend.MACD.
+
+Results keep the precision of their input. float64 is the default; a float32
+panel (stack(..., dtype=np.float32)) needs half the memory and, over 1000
+daily bars, stays within these bounds of the float64 values:
+
+    OBV    relative to the largest |OBV| of the row   1e-5
+    EMA    relative to the value                      2e-6
+    RSI    absolute, in RSI points                    1e-3
+    CCI    absolute, in CCI points                    1e-2
+
+for prices quoted in cents. Sums that run over the whole row (OBV, the EMA
+recursions) still round once per bar, so a cross or threshold check that is
+tied within these bounds can come out differently than in float64.
+"""
+import numpy as np
+from numpy.lib.stride_tricks import sliding_window_view
+from scipy.signal import lfilter
+from typing import List
+from pandas.core.frame import DataFrame
+
+
+def stack(frames: List[DataFrame], column, length, dtype=np.float64) -> np.ndarray:
+    """
+    Builds a (symbols, length) array of one column from many DataFrames.
+    Each row holds the last `length` values, right-aligned and padded with NaN on the left.
+    """
+    values = np.full((len(frames), length), np.nan, dtype=dtype)
+    for i, df in enumerate(frames):
+        column_values = df[column].values[-length:]
+        if len(column_values) > 0:
+            values[i, length - len(column_values):] = column_values
+    return values
+
+
+def ewm(values: np.ndarray, span=None, alpha=None, adjust=True, min_periods=0) -> np.ndarray:
+    """
+    Exponentially weighted mean along each row, same as pandas'
+    Series.ewm(span=span, alpha=alpha, adjust=adjust, min_periods=min_periods).mean().
+    Missing values keep the previous mean and still age the older weights (ignore_na=False).
+    """
+    if alpha is None:
+        alpha = 2.0 / (span + 1)
+    values = _floats(values)
+    present = ~np.isnan(values)
+    observations = np.cumsum(present, axis=1)
+    started = observations > 0
+
+    if adjust:
+        # The mean is a ratio of two decaying sums, both plain linear filters
+        if present.all():
+            weighted_sum = _decay_filter(values, 1.0 - alpha)
+            weights = ((1.0 - (1.0 - alpha) ** np.arange(1, values.shape[1] + 1)) / alpha).astype(values.dtype)
+        else:
+            weighted_sum = _decay_filter(np.where(present, values, 0.0), 1.0 - alpha)
+            weights = _decay_filter(present.astype(values.dtype), 1.0 - alpha)
+        with np.errstate(divide='ignore', invalid='ignore'):
+            out = weighted_sum / weights
+    elif (present | ~started).all():
+        # mean = (1 - alpha) * mean + alpha * value, starting from the first value
+        first = np.argmax(present, axis=1)
+        rows = np.flatnonzero(present.any(axis=1))
+        inputs = np.where(present, values * alpha, 0.0).astype(values.dtype)
+        inputs[rows, first[rows]] = values[rows, first[rows]]
+        out = _decay_filter(inputs, 1.0 - alpha)
+    else:
+        # Gaps inside a row change the weights, walk the bars one at a time
+        out = _ewm_loop(values, alpha, adjust)
+
+    out[observations < max(min_periods, 1)] = np.nan
+    return out
+
+
+def ewm_tail(values: np.ndarray, span, bars=1) -> np.ndarray:
+    """
+    The last `bars` columns of ewm(values, span) (adjust=True), without computing the rest.
+    Each one is a weighted sum over the row, so the whole universe is a single matrix product.
+    """
+    values = _floats(values)
+    present = ~np.isnan(values)
+    length = values.shape[1]
+    # weights[j, k] is the weight of bar j in the mean ending `bars - 1 - k` bars before the last
+    ages = (length - 1 - np.arange(length))[:, None] - (bars - 1 - np.arange(bars))[None, :]
+    weights = np.where(ages >= 0, (1.0 - 2.0 / (span + 1)) ** np.maximum(ages, 0), 0.0).astype(values.dtype)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        return np.where(present, values, 0.0) @ weights / (present.astype(values.dtype) @ weights)
+
+
+def _floats(values):
+    # float32 input stays float32, anything else becomes float64
+    values = np.asarray(values)
+    return values if values.dtype == np.float32 else values.astype(np.float64)
+
+
+def _decay_filter(inputs, decay):
+    # out[t] = decay * out[t - 1] + inputs[t] along each row, in the inputs' precision
+    coefficients = np.array([1.0, -decay], dtype=inputs.dtype)
+    return lfilter(coefficients[:1], coefficients, inputs, axis=1)
+
+
+def _ewm_loop(values, alpha, adjust):
+    decay = 1.0 - alpha
+    new_weight = 1.0 if adjust else alpha
+    columns = np.ascontiguousarray(values.T)
+    out = np.empty_like(columns)
+    weighted = np.full(columns.shape[1], np.nan)
+    old_weight = np.ones(columns.shape[1])
+    for t in range(columns.shape[0]):
+        current = columns[t]
+        is_observation = ~np.isnan(current)
+        started = ~np.isnan(weighted)
+
+        old_weight = np.where(started, old_weight * decay, old_weight)
+        update = started & is_observation
+        mixed = (old_weight * weighted + new_weight * current) / (old_weight + new_weight)
+        weighted = np.where(update & (weighted != current), mixed, weighted)
+        if adjust:
+            old_weight = np.where(update, old_weight + new_weight, old_weight)
+        else:
+            old_weight = np.where(update, 1.0, old_weight)
+        weighted = np.where(~started & is_observation, current, weighted)
+        out[t] = weighted
+    return out.T
+
+
+def smma(values: np.ndarray, period) -> np.ndarray:
+    """
+    Wilder's smoothed moving average along each row, as btalib computes it:
+    seeded with the average of the first `period` values, then
+    value = value * (1 - 1/period) + new / period.
+    Rows may start with NaN but should have no gaps after their first value.
+    """
+    alpha = 1.0 / period
+    values = _floats(values)
+    present = ~np.isnan(values)
+    first = np.argmax(present, axis=1)
+    seed_at = first + period - 1
+    rows = np.flatnonzero(present.any(axis=1) & (seed_at < values.shape[1]))
+
+    out = np.full(values.shape, np.nan, dtype=values.dtype)
+    if len(rows) > 0:
+        filled = np.where(present, values, 0.0)
+        seeds = np.cumsum(filled[rows], axis=1)[np.arange(len(rows)), seed_at[rows]] / period
+        after_seed = np.arange(values.shape[1]) > seed_at[rows][:, None]
+        inputs = np.where(after_seed, values[rows] * alpha, 0.0).astype(values.dtype)
+        inputs[np.arange(len(rows)), seed_at[rows]] = seeds
+        smoothed = _decay_filter(inputs, 1.0 - alpha)
+        smoothed[np.arange(values.shape[1]) < seed_at[rows][:, None]] = np.nan
+        out[rows] = smoothed
+    return out
+
+
+def sma(values: np.ndarray, period) -> np.ndarray:
+    """Simple moving average along each row, NaN unless the whole window has values."""
+    values = _floats(values)
+    out = np.full(values.shape, np.nan, dtype=values.dtype)
+    if values.shape[1] >= period:
+        present = ~np.isnan(values)
+        totals = _window_sums(np.where(present, values, 0.0), period)
+        counts = _window_sums(present.astype(np.int32), period)
+        out[:, period - 1:] = np.where(counts == period, totals / period, np.nan)
+    return out
+
+
+def slope(values: np.ndarray, window=3) -> np.ndarray:
+    """
+    Least-squares slope of the last `window` values at every bar, per bar,
+    the same as linregress(range(window), values[t - window + 1:t + 1]).slope.
+    NaN until a full window is available or where the window has a missing value.
+    """
+    values = _floats(values)
+    out = np.full(values.shape, np.nan, dtype=values.dtype)
+    if values.shape[1] >= window:
+        # The slope is a fixed weighted sum of the window: sum((x - mean(x)) * y) / sum((x - mean(x)) ** 2)
+        offsets = np.arange(window) - (window - 1) / 2.0
+        weights = (offsets / (offsets ** 2).sum()).astype(values.dtype)
+        out[:, window - 1:] = sliding_window_view(values, window, axis=1) @ weights
+    return out
+
+
+def _window_sums(values, period):
+    sums = np.cumsum(values, axis=1)
+    sums[:, period:] = sums[:, period:] - sums[:, :-period]
+    return sums[:, period - 1:]
+
+
+def obv(close: np.ndarray, volume: np.ndarray) -> np.ndarray:
+    """On-balance volume: the running sum of volume signed by the close-to-close direction."""
+    close, volume = _floats(close), _floats(volume)
+    pressure = np.sign(np.diff(close, axis=1)) * volume[:, 1:]
+    out = np.empty(np.shape(close), dtype=pressure.dtype)
+    out[:, 0] = np.nan
+    missing = np.isnan(pressure)
+    if missing.any():
+        # Like pandas' cumsum, missing values stay missing without breaking the sum
+        np.cumsum(np.where(missing, 0.0, pressure), axis=1, out=out[:, 1:])
+        out[:, 1:][missing] = np.nan
+    else:
+        np.cumsum(pressure, axis=1, out=out[:, 1:])
+    return out
+
+
+def obv_cross_up(close: np.ndarray, volume: np.ndarray, span=20) -> np.ndarray:
+    """
+    Whether the OBV crossed above its EMA (ewm(span=20)) on the last bar of each row,
+    the confirmation used for bullish candlestick patterns.
+    """
+    obv_values = obv(close, volume)
+    obv_ema = ewm_tail(obv_values, span=span, bars=2)
+    return (obv_values[:, -2] <= obv_ema[:, -2]) & (obv_values[:, -1] > obv_ema[:, -1])
+
+
+def rsi(close: np.ndarray, period=14) -> np.ndarray:
+    """Relative strength index with Wilder's smoothing."""
+    close = _floats(close)
+    change = np.full(close.shape, np.nan, dtype=close.dtype)
+    change[:, 1:] = np.diff(close, axis=1)
+    average_up = smma(np.clip(change, 0.0, None), period)
+    average_down = smma(np.abs(np.clip(change, None, 0.0)), period)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        return 100.0 - 100.0 / (1.0 + average_up / average_down)
+
+
+def cci(high: np.ndarray, low: np.ndarray, close: np.ndarray, period=20, factor=0.015) -> np.ndarray:
+    """Commodity channel index of the typical price (high + low + close) / 3."""
+    typical = (_floats(high) + low + close) / 3.0
+    # Mean and mean absolute deviation of each window, a block of rows at a time.
+    # Averaging the windows directly avoids the cancellation of running sums in float32
+    mean = np.full(typical.shape, np.nan, dtype=typical.dtype)
+    deviation = np.full(typical.shape, np.nan, dtype=typical.dtype)
+    if typical.shape[1] >= period:
+        for i in range(0, typical.shape[0], 256):
+            windows = sliding_window_view(typical[i:i + 256], period, axis=1)
+            window_mean = windows.mean(axis=2)
+            mean[i:i + 256, period - 1:] = window_mean
+            deviation[i:i + 256, period - 1:] = np.abs(windows - window_mean[:, :, None]).mean(axis=2)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        return (typical - mean) / (deviation * factor)
+
+
+def macd(close: np.ndarray, fast=12, slow=26, signal=9):
+    """
+    MACD line and signal line, as ta.trend.MACD computes them
+    (ewm(adjust=False) with min_periods equal to each span).
+    """
+    macd_line = ewm(close, span=fast, adjust=False, min_periods=fast) \
+        - ewm(close, span=slow, adjust=False, min_periods=slow)
+    return macd_line, ewm(macd_line, span=signal, adjust=False, min_periods=signal)
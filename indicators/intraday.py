@@ -0,0 +1,147 @@
+"""
+Alpha Vantage's technical indicators, computed locally from its intraday bars.
+
+Alpha Vantage serves the TA-Lib definitions, so these follow TA-Lib with the
+parameters the alpha_vantage client requests by default: SMA-seeded EMAs for
+MACD, Wilder's smoothing for RSI, zero where TA-Lib divides by zero, OBV
+starting from the first bar's volume and a VWAP that restarts every session.
+"""
+import numpy as np
+import pandas as pd
+from numpy.lib.stride_tricks import sliding_window_view
+from scipy.signal import lfilter
+from pandas.core.frame import DataFrame
+from indicators import engine
+
+
+def intraday_indicators(intraday: DataFrame) -> DataFrame:
+    """
+    Returns the indicators of an Alpha Vantage intraday DataFrame (sorted oldest first),
+    in the columns the TechIndicators endpoints use.
+    """
+    high = intraday['2. high'].values.astype(float)
+    low = intraday['3. low'].values.astype(float)
+    close = intraday['4. close'].values.astype(float)
+    volume = intraday['5. volume'].values.astype(float)
+
+    macd_line, macd_signal, macd_hist = macd(close)
+    slow_k, slow_d = stoch(high, low, close)
+    return pd.DataFrame({
+        'MACD': macd_line,
+        'MACD_Hist': macd_hist,
+        'MACD_Signal': macd_signal,
+        'RSI': rsi(close),
+        'CCI': cci(high, low, close),
+        'OBV': obv(close, volume),
+        'SlowK': slow_k,
+        'SlowD': slow_d,
+        'VWAP': vwap(high, low, close, volume, intraday.index.date)
+    }, index=intraday.index)
+
+
+def ema(values, period) -> np.ndarray:
+    """EMA seeded with the average of the first `period` values."""
+    values = np.asarray(values, dtype=float)
+    out = np.full(len(values), np.nan)
+    if len(values) >= period:
+        alpha = 2.0 / (period + 1)
+        seed = values[:period].mean()
+        out[period - 1] = seed
+        initial = [(1.0 - alpha) * seed]
+        out[period:] = lfilter([alpha], [1.0, alpha - 1.0], values[period:], zi=initial)[0]
+    return out
+
+
+def macd(close, fast=12, slow=26, signal=9):
+    """
+    MACD, signal and histogram. Like TA-Lib, both EMAs are seeded at the slow EMA's
+    first bar and nothing is returned until the signal line has a value.
+    """
+    close = np.asarray(close, dtype=float)
+    macd_line = np.full(len(close), np.nan)
+    macd_signal = np.full(len(close), np.nan)
+    if len(close) >= slow:
+        fast_ema = ema(close[slow - fast:], fast)[fast - 1:]
+        macd_line[slow - 1:] = fast_ema - ema(close, slow)[slow - 1:]
+        macd_signal[slow - 1:] = ema(macd_line[slow - 1:], signal)
+        macd_line[np.isnan(macd_signal)] = np.nan
+    return macd_line, macd_signal, macd_line - macd_signal
+
+
+def rsi(close, period=20) -> np.ndarray:
+    """Wilder's RSI, 0 when there were neither gains nor losses."""
+    change = np.diff(np.asarray(close, dtype=float), prepend=np.nan)
+    gains = engine.smma(np.clip(change, 0.0, None)[None, :], period)[0]
+    losses = engine.smma(np.abs(np.clip(change, None, 0.0))[None, :], period)[0]
+    total = gains + losses
+    with np.errstate(divide='ignore', invalid='ignore'):
+        return np.where(total != 0, 100.0 * gains / total, np.where(np.isnan(total), np.nan, 0.0))
+
+
+def cci(high, low, close, period=20) -> np.ndarray:
+    """Commodity channel index, 0 where the typical price does not deviate from its average."""
+    typical = (np.asarray(high, dtype=float) + low + close) / 3.0
+    out = np.full(len(typical), np.nan)
+    if len(typical) >= period:
+        windows = sliding_window_view(typical, period)
+        mean = windows.mean(axis=1)
+        deviation = np.abs(windows - mean[:, None]).mean(axis=1)
+        difference = typical[period - 1:] - mean
+        with np.errstate(divide='ignore', invalid='ignore'):
+            out[period - 1:] = np.where(
+                (difference != 0) & (deviation != 0), difference / (0.015 * deviation), 0.0
+            )
+    return out
+
+
+def obv(close, volume) -> np.ndarray:
+    """On-balance volume starting from the first bar's volume."""
+    close = np.asarray(close, dtype=float)
+    volume = np.asarray(volume, dtype=float)
+    if len(close) == 0:
+        return np.array([])
+    pressure = np.sign(np.diff(close)) * volume[1:]
+    return volume[0] + np.concatenate([[0.0], np.cumsum(pressure)])
+
+
+def stoch(high, low, close, fastk_period=5, slowk_period=3, slowd_period=3):
+    """Slow stochastic oscillator (SlowK, SlowD), both smoothed with simple averages."""
+    high = np.asarray(high, dtype=float)
+    low = np.asarray(low, dtype=float)
+    close = np.asarray(close, dtype=float)
+    fast_k = np.full(len(close), np.nan)
+    if len(close) >= fastk_period:
+        highest = sliding_window_view(high, fastk_period).max(axis=1)
+        lowest = sliding_window_view(low, fastk_period).min(axis=1)
+        spread = highest - lowest
+        with np.errstate(divide='ignore', invalid='ignore'):
+            fast_k[fastk_period - 1:] = np.where(
+                spread > 0, 100.0 * (close[fastk_period - 1:] - lowest) / spread, 0.0
+            )
+    slow_k = engine.sma(fast_k[None, :], slowk_period)[0]
+    slow_d = engine.sma(slow_k[None, :], slowd_period)[0]
+    slow_k[np.isnan(slow_d)] = np.nan
+    return slow_k, slow_d
+
+
+def vwap(high, low, close, volume, sessions) -> np.ndarray:
+    """
+    Volume weighted average of the typical price, restarting whenever `sessions`
+    (e.g. the date of each bar) changes.
+    """
+    typical = (np.asarray(high, dtype=float) + low + close) / 3.0
+    volume = np.asarray(volume, dtype=float)
+    sessions = np.asarray(sessions)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        return _session_cumsum(typical * volume, sessions) / _session_cumsum(volume, sessions)
+
+
+def _session_cumsum(values, sessions):
+    totals = np.cumsum(values)
+    if len(values) == 0:
+        return totals
+    # Subtract the running total from before each session started
+    new_session = np.concatenate([[True], sessions[1:] != sessions[:-1]])
+    session_start = np.maximum.accumulate(np.where(new_session, np.arange(len(values)), 0))
+    before = np.where(session_start > 0, totals[np.maximum(session_start - 1, 0)], 0.0)
+    return totals - before
@@ -1,3 +1,4 @@
+import numpy as np
 
 def macd_check(macd, prev_macd, signal, prev_signal, position):
     if macd and prev_macd and signal and prev_signal:
@@ -9,3 +10,16 @@ def macd_check(macd, prev_macd, signal, prev_signal, position):
         elif position and macd < signal:
             return 'Sell'
     return None
+
+def macd_signals(macd, prev_macd, signal, prev_signal, position):
+    """
+    Array version of macd_check, returning the (buy, sell) masks where it would
+    return 'Buy' or 'Sell'. `position` is a mask or a single bool.
+    """
+    macd, prev_macd = np.asarray(macd, dtype=float), np.asarray(prev_macd, dtype=float)
+    signal, prev_signal = np.asarray(signal, dtype=float), np.asarray(prev_signal, dtype=float)
+    holding = np.asarray(position, dtype=bool)
+    checked = (macd != 0) & (prev_macd != 0) & (signal != 0) & (prev_signal != 0)
+    buy = checked & ~holding & (macd > signal) & (prev_macd <= prev_signal)
+    sell = checked & holding & (macd < signal)
+    return buy, sell
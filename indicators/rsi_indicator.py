@@ -1,3 +1,4 @@
+import numpy as np
 
 def rsi_check(rsi, prev_rsi, position):
     if rsi:
@@ -6,3 +7,15 @@ def rsi_check(rsi, prev_rsi, position):
         if position and rsi > 70:
             return 'Sell'
     return None
+
+def rsi_signals(rsi, prev_rsi, position):
+    """
+    Array version of rsi_check, returning the (buy, sell) masks where it would
+    return 'Buy' or 'Sell'. `position` is a mask or a single bool.
+    """
+    rsi = np.asarray(rsi, dtype=float)
+    holding = np.asarray(position, dtype=bool)
+    checked = rsi != 0
+    buy = checked & ~holding & (rsi < 30)
+    sell = checked & holding & (rsi > 70)
+    return buy, sell
@@ -1,3 +1,4 @@
+import numpy as np
 
 def stoch_check(stoch, position):
     if not position and stoch < 20:
@@ -5,3 +6,14 @@ def stoch_check(stoch, position):
     if position and stoch > 80:
         return 'Sell'
     return False
+
+def stoch_signals(stoch, position):
+    """
+    Array version of stoch_check, returning the (buy, sell) masks where it would
+    return 'Buy' or 'Sell'. `position` is a mask or a single bool.
+    """
+    stoch = np.asarray(stoch, dtype=float)
+    holding = np.asarray(position, dtype=bool)
+    buy = ~holding & (stoch < 20)
+    sell = holding & (stoch > 80)
+    return buy, sell
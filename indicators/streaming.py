@@ -0,0 +1,272 @@
+"""
+Indicators that update one bar at a time in constant time and memory.
+
+Each object holds only the running state needed for its next value, so
+live bots can seed them once from their warm-up history and then feed
+every new bar without keeping or recomputing a DataFrame. The values
+match the batch versions in indicators.engine.
+"""
+import math
+from collections import deque
+from datetime import timedelta
+import numpy as np
+
+
+class StreamingEMA:
+    """
+    Exponentially weighted mean, same as pandas' ewm(span=span, adjust=adjust).mean().
+
+    With adjust=True the mean is kept as a decaying weighted sum and the sum of
+    its weights. Missing values (NaN) keep the mean and age the older weights.
+    """
+
+    def __init__(self, span=None, alpha=None, adjust=True):
+        self.alpha = alpha if alpha is not None else 2.0 / (span + 1)
+        self.adjust = adjust
+        self.weighted_sum = 0.0
+        self.weights = 0.0
+        self.value = math.nan
+
+    def update(self, value) -> float:
+        decay = 1.0 - self.alpha
+        if self.adjust:
+            self.weighted_sum *= decay
+            self.weights *= decay
+            if not math.isnan(value):
+                self.weighted_sum += value
+                self.weights += 1.0
+            if self.weights > 0:
+                self.value = self.weighted_sum / self.weights
+        elif not math.isnan(value):
+            if math.isnan(self.value):
+                self.value = value
+            else:
+                self.value = decay * self.value + self.alpha * value
+        return self.value
+
+    def seed(self, values):
+        """Feeds a whole history, oldest first."""
+        for value in values:
+            self.update(float(value))
+        return self
+
+
+class StreamingOBV:
+    """
+    On-balance volume, same as btalib's obv(): NaN on the first bar and where
+    a close or volume is missing, without breaking the running total.
+    """
+
+    def __init__(self):
+        self.close = math.nan
+        self.total = 0.0
+        self.value = math.nan
+
+    def update(self, close, volume) -> float:
+        close, volume = float(close), float(volume)
+        pressure = ((close > self.close) - (close < self.close)) * volume
+        if math.isnan(close) or math.isnan(self.close) or math.isnan(pressure):
+            self.value = math.nan
+        else:
+            self.total += pressure
+            self.value = self.total
+        self.close = close
+        return self.value
+
+
+class OBVCross:
+    """
+    OBV and its EMA (ewm(span=20)), plus whether the OBV crossed its EMA on the latest bar.
+    """
+
+    def __init__(self, span=20):
+        self.obv = StreamingOBV()
+        self.obv_ema = StreamingEMA(span=span)
+        self.previous = (math.nan, math.nan)
+
+    def update(self, close, volume):
+        """Adds a bar and returns the new (obv, obv_ema)."""
+        self.previous = (self.obv.value, self.obv_ema.value)
+        obv = self.obv.update(close, volume)
+        return obv, self.obv_ema.update(obv)
+
+    def seed(self, closes, volumes):
+        """Feeds the warm-up bars, oldest first."""
+        for close, volume in zip(closes, volumes):
+            self.update(float(close), float(volume))
+        return self
+
+    @property
+    def close(self):
+        return self.obv.close
+
+    @property
+    def crossed_above(self) -> bool:
+        previous_obv, previous_ema = self.previous
+        return previous_obv <= previous_ema and self.obv.value > self.obv_ema.value
+
+    @property
+    def crossed_below(self) -> bool:
+        previous_obv, previous_ema = self.previous
+        return previous_obv >= previous_ema and self.obv.value < self.obv_ema.value
+
+
+class MACDBank:
+    """
+    MACD lines of one symbol for several (fast, slow, signal) windows at once,
+    as ta.trend.macd() and ta.trend.macd_signal() compute them over the closes.
+
+    The EMAs of every distinct window are updated together in one vector step
+    per bar, and the last `history` values of each MACD line and signal line
+    are kept for the trading checks. A bar with the same timestamp as the
+    previous one replaces it, like assigning it into the minute history does.
+    """
+
+    def __init__(self, windows, history=3):
+        self.windows = list(windows)
+        self.spans = sorted(set(span for fast, slow, _ in self.windows for span in (fast, slow)))
+        self.alphas = 2.0 / (np.array(self.spans, dtype=float) + 1)
+        self.emas = np.full(len(self.spans), np.nan)
+        self.count = 0
+        self.signals = [StreamingEMA(span=signal, adjust=False) for _, _, signal in self.windows]
+        self.signal_counts = [0] * len(self.windows)
+        self.macds = [deque([math.nan] * history, maxlen=history) for _ in self.windows]
+        self.signal_values = [deque([math.nan] * history, maxlen=history) for _ in self.windows]
+        self.timestamp = None
+        self.previous = None
+
+    def update(self, close, timestamp=None):
+        """Adds a bar's close, or replaces the last one if `timestamp` is the same."""
+        if timestamp is not None and timestamp == self.timestamp and self.previous is not None:
+            self._restore(self.previous)
+        self.previous = self._snapshot()
+        self.timestamp = timestamp
+
+        close = float(close)
+        # Missing closes are skipped, like the dropna() before ta.trend.macd
+        if math.isnan(close):
+            return
+        self.count += 1
+        if self.count == 1:
+            self.emas[:] = close
+        else:
+            self.emas = (1.0 - self.alphas) * self.emas + self.alphas * close
+
+        for i, (fast, slow, signal) in enumerate(self.windows):
+            macd = math.nan
+            if self.count >= max(fast, slow):
+                macd = self.emas[self.spans.index(fast)] - self.emas[self.spans.index(slow)]
+                self.signal_counts[i] += 1
+                self.signals[i].update(macd)
+            self.macds[i].append(macd)
+            self.signal_values[i].append(
+                self.signals[i].value if self.signal_counts[i] >= signal else math.nan
+            )
+
+    def seed(self, closes, timestamps=None):
+        """Feeds the warm-up bars, oldest first."""
+        if timestamps is None:
+            timestamps = [None] * len(closes)
+        for close, timestamp in zip(closes, timestamps):
+            self.update(close, timestamp)
+        return self
+
+    def macd(self, fast, slow) -> np.ndarray:
+        """The last MACD line values for the (fast, slow) windows, oldest first."""
+        return np.array(self.macds[self._window(fast, slow)])
+
+    def signal(self, fast, slow) -> np.ndarray:
+        """The last signal line values for the (fast, slow) windows, oldest first."""
+        return np.array(self.signal_values[self._window(fast, slow)])
+
+    def histogram(self, fast, slow) -> np.ndarray:
+        """The last MACD line minus signal line values, as ta.trend.macd_diff()."""
+        return self.macd(fast, slow) - self.signal(fast, slow)
+
+    def _window(self, fast, slow):
+        for i, (window_fast, window_slow, _) in enumerate(self.windows):
+            if window_fast == fast and window_slow == slow:
+                return i
+        raise KeyError(f'No MACD window ({fast}, {slow})')
+
+    def _snapshot(self):
+        return (
+            self.emas.copy(),
+            self.count,
+            [(signal.value, signal.weighted_sum, signal.weights) for signal in self.signals],
+            list(self.signal_counts),
+            [deque(values, maxlen=values.maxlen) for values in self.macds],
+            [deque(values, maxlen=values.maxlen) for values in self.signal_values]
+        )
+
+    def _restore(self, snapshot):
+        self.emas, self.count, signals, self.signal_counts, self.macds, self.signal_values = snapshot
+        for signal, (value, weighted_sum, weights) in zip(self.signals, signals):
+            signal.value, signal.weighted_sum, signal.weights = value, weighted_sum, weights
+
+
+class PivotLow:
+    """
+    Most recent pivot low of the day in `minutes`-minute bars, built from minute lows.
+
+    A bar is a pivot low when its low is at or below the previous bar's and the
+    next bar's low is higher. Only the current bar's minute lows and the last
+    two finished bars are kept, so reading the pivot is constant time.
+    A minute with the same timestamp as an earlier one replaces its low.
+    """
+
+    def __init__(self, minutes=5):
+        self.minutes = minutes
+        self.day = None
+        self.bar_start = None
+        self.bar_lows = {}
+        self.finished = deque(maxlen=2)
+        self.confirmed = math.nan
+
+    def update(self, low, timestamp):
+        """Adds a minute bar's low."""
+        low = float(low)
+        if math.isnan(low):
+            return
+        day = timestamp.date()
+        bar_start = timestamp.replace(second=0, microsecond=0) \
+            - timedelta(minutes=timestamp.minute % self.minutes)
+        if day != self.day:
+            # Pivots only count within the trading day
+            self.day = day
+            self.bar_start = None
+            self.bar_lows = {}
+            self.finished.clear()
+            self.confirmed = math.nan
+        if bar_start != self.bar_start:
+            if self.bar_lows:
+                bar_low = min(self.bar_lows.values())
+                if len(self.finished) == 2 and self._is_pivot(*self.finished, bar_low):
+                    self.confirmed = self.finished[1]
+                self.finished.append(bar_low)
+            self.bar_start = bar_start
+            self.bar_lows = {}
+        self.bar_lows[timestamp] = low
+
+    def seed(self, lows, timestamps):
+        """Feeds the warm-up minute bars, oldest first."""
+        for low, timestamp in zip(lows, timestamps):
+            self.update(low, timestamp)
+        return self
+
+    @property
+    def value(self) -> float:
+        """The latest pivot low, counting the bar in progress as the confirming bar."""
+        if len(self.finished) == 2 and self.bar_lows \
+                and self._is_pivot(*self.finished, min(self.bar_lows.values())):
+            return self.finished[1]
+        return self.confirmed
+
+    def stop(self, default) -> float:
+        """A stop just under the latest pivot low, or `default` if there is none yet."""
+        pivot = self.value
+        return default if math.isnan(pivot) else pivot - 0.01
+
+    @staticmethod
+    def _is_pivot(before, low, after):
+        return low <= before and after > low
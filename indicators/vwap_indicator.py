@@ -1,3 +1,4 @@
+import numpy as np
 
 def vwap_check(vwap, price, position):
     if vwap and price:
@@ -6,3 +7,15 @@ def vwap_check(vwap, price, position):
         if position and price < (vwap * 0.995):
             return 'Sell'
     return None
+
+def vwap_signals(vwap, price, position):
+    """
+    Array version of vwap_check, returning the (buy, sell) masks where it would
+    return 'Buy' or 'Sell'. `position` is a mask or a single bool.
+    """
+    vwap, price = np.asarray(vwap, dtype=float), np.asarray(price, dtype=float)
+    holding = np.asarray(position, dtype=bool)
+    checked = (vwap != 0) & (price != 0)
+    buy = checked & ~holding & (price > (vwap * 1.005))
+    sell = checked & holding & (price < (vwap * 0.995))
+    return buy, sell
@@ -1,9 +1,9 @@
-import alpaca_trade_api as tradeapi
 import pandas as pd
 import statistics
 import sys
 import time
-from google.cloud import storage
+from alpaca_client import get_api
+from trading_calendar import TradingCalendar
 from datetime import datetime, timedelta
 from pytz import timezone
 
@@ -31,14 +31,8 @@ def get_ratings(symbols, algo_time = None):
     
     # For backtesting
     if algo_time is not None:
-        distance = window_size + 1
-        market_days = 0
         # Determine the start date that contains `window_size` market days
-        while market_days != window_size:
-            start_date = algo_time.date() - timedelta(days=distance)
-            calendars = api.get_calendar(start_date.strftime("%Y-%m-%d"), algo_time.strftime("%Y-%m-%d"))
-            market_days = len(calendars)
-            distance += 1
+        start_date = calendar.last_sessions(algo_time, window_size)[0]
     else:
         start_date = None
     # print(start_date.strftime("%Y-%m-%d"))
@@ -263,15 +257,8 @@ def run_live(api):
 
 
 if __name__ == '__main__':
-    # Get Alpaca API key and secret
-    storage_client = storage.Client()
-    bucket = storage_client.get_bucket('derek-algo-trading-bucket')
-    blob = bucket.blob('alpaca-api-key.txt')
-    api_key = blob.download_as_text()
-    blob = bucket.blob('alpaca-secret-key.txt')
-    secret_key = blob.download_as_text()
-    base_url = 'https://paper-api.alpaca.markets'
-    api = tradeapi.REST(api_key, secret_key, base_url, 'v2')
+    api = get_api()
+    calendar = TradingCalendar(api)
 
     if len(sys.argv) < 2:
         print('Error: please specify a command; either "run" or "backtest <cash balance> <number of days to test>".')
@@ -0,0 +1,298 @@
+import os
+import json
+from typing import Dict, List
+import numpy as np
+import pandas as pd
+from pandas.core.frame import DataFrame
+import detect_pattern as pattern
+from bar_store import BAR_COLUMNS
+from bar_panel import BarPanel
+from indicators import engine
+
+# Where the index is written
+PATTERN_INDEX_DIR = os.environ.get('PATTERN_INDEX_DIR', 'data/pattern_index')
+
+HIT_COLUMNS = ['date', 'symbol', 'pattern', 'obv_confirmed', 'close', 'volume']
+
+# One row per (symbol, session) that was indexed, with the sum of the
+# bar's prices and its volume to notice when the bar changes
+COVERAGE_COLUMNS = ['symbol', 'date', 'price', 'volume']
+
+
+class PatternIndex:
+    """
+    On-disk index of the bullish candlestick patterns found on each day.
+
+    Every hit is stored with its bar date, symbol, pattern, whether the OBV
+    confirmed it (crossed above its EMA that day), and the day's close and
+    volume. Rows are sorted by date in ``<root>/hits.parquet``, so once
+    loaded a day's hits are a binary search away.
+
+    ``<root>/coverage.parquet`` records every (symbol, session) that was
+    indexed, so updating only scans the pairs that are not indexed yet,
+    whichever symbols the previous runs had. When an indexed bar changed
+    since (e.g. a bar that was still forming got fetched again), the hits of
+    that symbol from that day on are dropped and scanned again.
+
+    Only days with at least `min_history` bars up to them are indexed, like
+    the selectors only screen stocks with 1000 days of history. The index
+    is rebuilt when it was written with another `min_history`.
+    """
+
+    def __init__(self, root=PATTERN_INDEX_DIR, min_history=1000):
+        self.root = root
+        self.min_history = min_history
+        self.hits = pd.DataFrame(columns=HIT_COLUMNS)
+        self.sessions = np.array([], dtype='datetime64[ns]')
+        # Indexed (dates, prices, volumes) of each symbol, sorted by date
+        self.coverage = {}
+        if os.path.exists(self._path('meta.json')):
+            with open(self._path('meta.json')) as f:
+                meta = json.load(f)
+            if meta.get('min_history') == min_history:
+                self.hits = pd.read_parquet(self._path('hits.parquet'))
+                self.sessions = np.load(self._path('sessions.npy'))
+                self._load_coverage(pd.read_parquet(self._path('coverage.parquet')))
+            else:
+                print(f"Pattern index was built with min_history={meta.get('min_history')}, rebuilding it")
+        self.dates = self.hits['date'].values.astype('datetime64[ns]')
+
+    def day(self, date) -> DataFrame:
+        """All the hits on the session of `date`."""
+        date = _utc(date)
+        i = self.dates.searchsorted(date, side='left')
+        j = self.dates.searchsorted(date, side='right')
+        return self.hits.iloc[i:j]
+
+    def candidates(self, date, exclude: List[str] = ()) -> DataFrame:
+        """
+        The OBV-confirmed hits of the last session before `date`, what the
+        swing selector would find buying on `date`, as rows with the symbol,
+        bullish pattern, close and volume indexed by the bar date.
+        """
+        i = self.sessions.searchsorted(_utc(pd.Timestamp(date) - pd.Timedelta(days=1)), side='right')
+        if i == 0:
+            return pd.DataFrame(columns=['symbol', 'bullish', 'close', 'volume'])
+        hits = self.day(self.sessions[i - 1])
+        hits = hits[hits['obv_confirmed'] & ~hits['symbol'].isin(list(exclude))]
+        return pd.DataFrame({
+            'symbol': hits['symbol'].values,
+            'bullish': hits['pattern'].values,
+            'close': hits['close'].values,
+            'volume': hits['volume'].values
+        }, index=pd.DatetimeIndex(hits['date'].values).tz_localize('UTC'))
+
+    def update_from_panel(self, panel: BarPanel, block=1000):
+        """Indexes the panel's (symbol, session) pairs that are not indexed yet, `block` symbols at a time."""
+        dates = panel.dates.tz_convert('UTC').tz_localize(None).values
+        hits, changed, sessions = [], {}, []
+        for i in range(0, len(panel.symbols), block):
+            block_hits, block_changed, block_sessions = self._scan(
+                panel.symbols[i:i + block],
+                dates,
+                np.asarray(panel.data[i:i + block], dtype=float)
+            )
+            hits.append(block_hits)
+            changed.update(block_changed)
+            sessions.append(block_sessions)
+        return self._append(hits, changed, np.concatenate(sessions))
+
+    def add_day(self, symbols: List[str], dates, bars, codes, confirmed):
+        """
+        Indexes the last bar of each symbol from the patterns already found on it,
+        e.g. by the nightly selector, without scanning the history again.
+
+        `dates` and `bars` (symbols, days, OHLCV) hold each symbol's trailing bars,
+        oldest first, `codes` the index in BULLISH_PATTERNS of the pattern ending on
+        the last bar whether or not the OBV confirmed it, and `confirmed` whether
+        the OBV crossed above its EMA on that bar. The caller only passes symbols
+        with at least `min_history` bars. Trailing bars that were indexed from other
+        values mark the symbol changed from that day on, like `update_from_panel`
+        does, which indexes the days in between again on its next run.
+        """
+        dates = np.asarray(dates, dtype='datetime64[ns]')
+        bars = np.asarray(bars, dtype=float)
+        prices, volumes = _checksums(bars)
+        rows, changed = [], {}
+        for row, symbol in enumerate(symbols):
+            if symbol in self.coverage:
+                indexed_dates, indexed_prices, indexed_volumes = self.coverage[symbol]
+                positions = indexed_dates.searchsorted(dates[row])
+                inside = positions < len(indexed_dates)
+                inside[inside] = indexed_dates[positions[inside]] == dates[row][inside]
+                different = np.zeros(inside.shape, dtype=bool)
+                different[inside] = (
+                    (indexed_prices[positions[inside]] != prices[row][inside])
+                    | (indexed_volumes[positions[inside]] != volumes[row][inside])
+                )
+                if different.any():
+                    first_changed = dates[row][different].min()
+                    changed[symbol] = first_changed
+                    keep = indexed_dates < first_changed
+                    self.coverage[symbol] = (indexed_dates[keep], indexed_prices[keep], indexed_volumes[keep])
+                elif inside[-1]:
+                    # Already indexed from the same bar
+                    continue
+            self._cover(symbol, dates[row, -1:], prices[row, -1:], volumes[row, -1:])
+            rows.append(row)
+
+        rows = np.array(rows, dtype=int)
+        found = rows[np.asarray(codes)[rows] > 0]
+        hits = pd.DataFrame({
+            'date': dates[found, -1],
+            'symbol': np.array(symbols, dtype=object)[found],
+            'pattern': np.array(pattern.BULLISH_PATTERNS, dtype=object)[np.asarray(codes)[found]],
+            'obv_confirmed': np.asarray(confirmed, dtype=bool)[found],
+            'close': bars[found, -1, 3],
+            'volume': bars[found, -1, 4]
+        })
+        return self._append([hits], changed, np.unique(dates[rows, -1]))
+
+    def _scan(self, symbols, dates, bars):
+        # Returns the hits on the days of each symbol that are not indexed yet, the first
+        # changed day of the symbols whose indexed bars changed, and the sessions indexed.
+        # bars is (symbols, days, OHLCV) with NaN on days a symbol did not trade
+        valid = ~np.isnan(bars[:, :, 3])
+        enough_history = valid & (np.cumsum(valid, axis=1) >= self.min_history)
+        prices, volumes = _checksums(bars)
+
+        # Days already indexed from the same bars
+        covered = np.zeros(valid.shape, dtype=bool)
+        changed = {}
+        for row, symbol in enumerate(symbols):
+            if symbol not in self.coverage:
+                continue
+            indexed_dates, indexed_prices, indexed_volumes = self.coverage[symbol]
+            days = dates.searchsorted(indexed_dates)
+            inside = days < len(dates)
+            inside[inside] = dates[days[inside]] == indexed_dates[inside]
+            days = days[inside]
+            different = (
+                ~valid[row, days]
+                | (prices[row, days] != indexed_prices[inside])
+                | (volumes[row, days] != indexed_volumes[inside])
+            )
+            if different.any():
+                # The patterns and OBV of every later day depend on the changed bar too
+                first_changed = indexed_dates[inside][different].min()
+                changed[symbol] = first_changed
+                keep = indexed_dates < first_changed
+                self.coverage[symbol] = (indexed_dates[keep], indexed_prices[keep], indexed_volumes[keep])
+                days = days[indexed_dates[inside] < first_changed]
+            covered[row, days] = True
+
+        needed = enough_history & ~covered
+        if not needed.any():
+            return pd.DataFrame(columns=HIT_COLUMNS), changed, np.array([], dtype='datetime64[ns]')
+
+        # Patterns are found on each symbol's own trading days, like on its DataFrame,
+        # so the traded days are moved to the front of each row first
+        order = np.argsort(~valid, axis=1, kind='stable')
+        traded = np.take_along_axis(bars, order[:, :, None], axis=1)
+        open, high, low, close, volume = [traded[:, :, k] for k in range(len(BAR_COLUMNS))]
+
+        found = pattern.scan_bullish_patterns(open, high, low, close, obv_crossed=True)
+        obv = engine.obv(close, volume)
+        obv_ema = engine.ewm(obv, span=20)
+        crossed = np.zeros(close.shape, dtype=bool)
+        crossed[:, 1:] = (obv[:, :-1] <= obv_ema[:, :-1]) & (obv[:, 1:] > obv_ema[:, 1:])
+
+        # Back to calendar days
+        codes = np.zeros(found.shape, dtype=found.dtype)
+        confirmed = np.zeros(crossed.shape, dtype=bool)
+        np.put_along_axis(codes, order, found, axis=1)
+        np.put_along_axis(confirmed, order, crossed, axis=1)
+
+        rows, days = np.nonzero((codes > 0) & needed)
+        hits = pd.DataFrame({
+            'date': dates[days],
+            'symbol': np.array(symbols, dtype=object)[rows],
+            'pattern': np.array(pattern.BULLISH_PATTERNS, dtype=object)[codes[rows, days]],
+            'obv_confirmed': confirmed[rows, days],
+            'close': bars[rows, days, 3].astype(float),
+            'volume': bars[rows, days, 4].astype(float)
+        })
+
+        # Record the newly indexed days of each symbol
+        for row in np.nonzero(needed.any(axis=1))[0]:
+            days = np.nonzero(needed[row])[0]
+            self._cover(symbols[row], dates[days], prices[row, days], volumes[row, days])
+
+        return hits, changed, dates[needed.any(axis=0)]
+
+    def _cover(self, symbol, dates, prices, volumes):
+        # Records newly indexed days of a symbol, keeping its coverage sorted by date
+        indexed = self.coverage.get(symbol, (dates[:0], prices[:0], volumes[:0]))
+        merged = [
+            np.concatenate([old_values, new_values])
+            for old_values, new_values in zip(indexed, (dates, prices, volumes))
+        ]
+        order_by_date = np.argsort(merged[0], kind='stable')
+        self.coverage[symbol] = tuple(values[order_by_date] for values in merged)
+
+    def _append(self, hits: List[DataFrame], changed: Dict, sessions):
+        if len(sessions) == 0 and len(changed) == 0:
+            return self
+
+        # Forget the hits found from bars that changed since
+        if changed:
+            print(f'Bars of {len(changed)} symbols changed since they were indexed, indexing them again')
+            first_changed = self.hits['symbol'].map(changed).values.astype('datetime64[ns]')
+            dates = self.hits['date'].values.astype('datetime64[ns]')
+            self.hits = self.hits[np.isnat(first_changed) | (dates < first_changed)]
+
+        hits = [df for df in [self.hits] + hits if len(df.index) > 0]
+        hits = pd.concat(hits, ignore_index=True) if hits else pd.DataFrame(columns=HIT_COLUMNS)
+        self.hits = hits.sort_values(['date', 'symbol'], kind='mergesort').reset_index(drop=True)
+        self.sessions = np.union1d(self.sessions, np.asarray(sessions, dtype='datetime64[ns]'))
+        self.dates = self.hits['date'].values.astype('datetime64[ns]')
+
+        if not os.path.exists(self.root):
+            os.makedirs(self.root)
+        self.hits.to_parquet(self._path('hits.parquet'), index=False)
+        self._coverage_frame().to_parquet(self._path('coverage.parquet'), index=False)
+        np.save(self._path('sessions.npy'), self.sessions)
+        with open(self._path('meta.json'), 'w') as f:
+            json.dump({'min_history': self.min_history}, f)
+        print(f'Pattern index: {len(self.hits.index)} hits over {len(self.sessions)} sessions '
+              f'of {len(self.coverage)} symbols')
+        return self
+
+    def _load_coverage(self, coverage: DataFrame):
+        coverage = coverage.sort_values(['symbol', 'date'], kind='mergesort')
+        symbols = coverage['symbol'].values
+        dates = coverage['date'].values.astype('datetime64[ns]')
+        prices = coverage['price'].values.astype(float)
+        volumes = coverage['volume'].values.astype(float)
+        starts = np.flatnonzero(np.r_[True, symbols[1:] != symbols[:-1]]) if len(symbols) else []
+        ends = list(starts[1:]) + [len(symbols)]
+        for i, j in zip(starts, ends):
+            self.coverage[symbols[i]] = (dates[i:j], prices[i:j], volumes[i:j])
+
+    def _coverage_frame(self) -> DataFrame:
+        symbols = list(self.coverage.keys())
+        indexed = list(self.coverage.values())
+        return pd.DataFrame({
+            'symbol': np.repeat(np.array(symbols, dtype=object), [len(dates) for dates, _, _ in indexed]),
+            'date': np.concatenate([dates for dates, _, _ in indexed] or [np.array([], dtype='datetime64[ns]')]),
+            'price': np.concatenate([prices for _, prices, _ in indexed] or [np.array([])]),
+            'volume': np.concatenate([volumes for _, _, volumes in indexed] or [np.array([])])
+        }, columns=COVERAGE_COLUMNS)
+
+    def _path(self, name):
+        return os.path.join(self.root, name)
+
+
+def _checksums(bars):
+    # Sum of each bar's prices and its volume, compared at the
+    # panel's float32 precision so bars from frames and panels agree
+    prices = bars[..., :4].astype(np.float32).astype(float).sum(axis=-1)
+    volumes = bars[..., 4].astype(np.float32).astype(float)
+    return prices, volumes
+
+
+def _utc(date):
+    date = pd.Timestamp(date)
+    if date.tzinfo is not None:
+        date = date.tz_convert('UTC').tz_localize(None)
+    return np.datetime64(date, 'ns')
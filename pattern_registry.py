@@ -0,0 +1,219 @@
+"""
+Candlestick patterns declared as rules over offset candles.
+
+A rule is written with `c[-1]` for the candle of the day being checked,
+`c[-2]` for the day before and so on, e.g.
+
+    register('bullish_engulfing', 'bullish',
+             c[-3].is_bearish & c[-2].is_bullish & (c[-2].close > c[-3].open) & ...)
+
+Each rule is compiled once into a single numpy expression over CandleArray
+views, and `scan` evaluates every registered pattern over a whole
+(symbols, days) panel, returning a bitmask of all the patterns that end on
+each day. Bit i of the mask is PATTERNS[i]. `scan_last` does the same for
+the last of a few Candle objects, when checking one new bar at a time.
+"""
+from typing import List
+import numpy as np
+from candle import Candle, CandleArray
+
+MAX_PATTERNS = 32
+
+# Candle fields a rule can use
+FIELDS = ('open', 'high', 'low', 'close', 'body', 'body_center', 'is_bullish', 'is_bearish')
+
+
+class Expr:
+    """A node of a rule, kept as the numpy source it compiles to."""
+
+    def __init__(self, source, offsets=()):
+        self.source = source
+        self.offsets = frozenset(offsets)
+
+    def _combine(self, operator, other, reverse=False):
+        if isinstance(other, Expr):
+            other_source, offsets = other.source, self.offsets | other.offsets
+        else:
+            other_source, offsets = repr(float(other)), self.offsets
+        left, right = (other_source, self.source) if reverse else (self.source, other_source)
+        return Expr(f'({left} {operator} {right})', offsets)
+
+    def __gt__(self, other): return self._combine('>', other)
+    def __ge__(self, other): return self._combine('>=', other)
+    def __lt__(self, other): return self._combine('<', other)
+    def __le__(self, other): return self._combine('<=', other)
+    def __and__(self, other): return self._combine('&', other)
+    def __or__(self, other): return self._combine('|', other)
+    def __add__(self, other): return self._combine('+', other)
+    def __sub__(self, other): return self._combine('-', other)
+    def __mul__(self, other): return self._combine('*', other)
+    def __truediv__(self, other): return self._combine('/', other)
+    def __radd__(self, other): return self._combine('+', other, reverse=True)
+    def __rsub__(self, other): return self._combine('-', other, reverse=True)
+    def __rmul__(self, other): return self._combine('*', other, reverse=True)
+    def __rtruediv__(self, other): return self._combine('/', other, reverse=True)
+
+    def __repr__(self):
+        return self.source
+
+
+class _OffsetCandle:
+    def __init__(self, offset):
+        self.offset = offset
+
+    def __getattr__(self, field):
+        if field not in FIELDS:
+            raise AttributeError(f'Candles have no field {field}, use one of {FIELDS}')
+        return Expr(f'c[{self.offset}].{field}', [self.offset])
+
+
+class _Candles:
+    def __getitem__(self, offset):
+        if not isinstance(offset, int) or offset >= 0:
+            raise IndexError('Candles are indexed from the day being checked back: c[-1], c[-2], ...')
+        return _OffsetCandle(offset)
+
+
+# The candles rules are written over
+c = _Candles()
+
+
+class Pattern:
+    def __init__(self, name, direction, rule: Expr):
+        self.name = name
+        self.direction = direction
+        self.source = rule.source
+        # Number of days the pattern spans, ending on the day being checked
+        self.length = -min(rule.offsets)
+        self.evaluate = eval(compile(f'lambda c: {rule.source}', f'<pattern {name}>', 'eval'))
+
+
+PATTERNS: List[Pattern] = []
+
+
+def register(name, direction, rule: Expr) -> Pattern:
+    """Adds a pattern, `direction` being 'bullish' or 'bearish'."""
+    assert direction in ('bullish', 'bearish')
+    assert name not in names(), f'Pattern {name} is already registered'
+    assert len(PATTERNS) < MAX_PATTERNS
+    pattern = Pattern(name, direction, rule)
+    PATTERNS.append(pattern)
+    return pattern
+
+
+def names(direction=None) -> List[str]:
+    return [pattern.name for pattern in PATTERNS if direction is None or pattern.direction == direction]
+
+
+def get(name) -> Pattern:
+    for pattern in PATTERNS:
+        if pattern.name == name:
+            return pattern
+    raise KeyError(f'Pattern {name} is not registered')
+
+
+def bit(name) -> int:
+    return 1 << names().index(name)
+
+
+def direction_mask(direction) -> int:
+    return sum(bit(name) for name in names(direction))
+
+
+def scan(candles: CandleArray) -> np.ndarray:
+    """
+    Bitmask of the registered patterns ending on each day of `candles`
+    (1-D days or 2-D symbols x days). Days without enough history are 0.
+    """
+    mask = np.zeros(candles.shape, dtype=np.uint32)
+    days = candles.shape[-1]
+    views = {}
+    with np.errstate(divide='ignore', invalid='ignore'):
+        for i, pattern in enumerate(PATTERNS):
+            length = pattern.length
+            if days < length:
+                continue
+            if length not in views:
+                # c[-k] for the days length - 1 and later
+                views[length] = {
+                    -k: candles[..., length - k:days - k + 1] for k in range(1, length + 1)
+                }
+            matched = pattern.evaluate(views[length])
+            mask[..., length - 1:] |= matched.astype(np.uint32) << np.uint32(i)
+    return mask
+
+
+def scan_last(candles: List[Candle]) -> int:
+    """
+    Bitmask of the registered patterns ending on the last of a few candles,
+    oldest first, evaluated on the Candle objects without building arrays.
+    """
+    offsets = {-k: candle for k, candle in zip(range(len(candles), 0, -1), candles)}
+    mask = 0
+    for i, pattern in enumerate(PATTERNS):
+        if pattern.length <= len(candles) and matches(pattern, offsets):
+            mask |= 1 << i
+    return mask
+
+
+def matches(pattern: Pattern, offsets) -> bool:
+    """Whether `pattern` matches the Candle objects of `offsets` ({-1: last candle, -2: ...})."""
+    try:
+        return bool(pattern.evaluate(offsets))
+    except ZeroDivisionError:
+        # A zero body divides to inf/nan over arrays, do the same with numpy scalars
+        offsets = {
+            offset: CandleArray(*[np.float64(getattr(candle, field)) for field in ['open', 'high', 'low', 'close']])
+            for offset, candle in offsets.items()
+        }
+        with np.errstate(divide='ignore', invalid='ignore'):
+            return bool(pattern.evaluate(offsets))
+
+
+def matched(mask, direction=None) -> List[str]:
+    """Names of the patterns set in one day's mask, in registration order."""
+    return [name for name in names(direction) if int(mask) & bit(name)]
+
+
+# Bullish patterns, in the order detect_pattern reports them
+
+register('bullish_engulfing', 'bullish',
+    # A red then green candle, the green body engulfing the red one,
+    # then a 3rd candle going higher than the green one
+    c[-3].is_bearish & c[-2].is_bullish
+    & (c[-2].close > c[-3].open) & (c[-2].open < c[-3].close)
+    & (c[-1].high > c[-2].high))
+
+register('three_white_knights', 'bullish',
+    # Three green candles with opens and closes rising every day
+    c[-3].is_bullish & c[-2].is_bullish & c[-1].is_bullish
+    & (c[-1].open > c[-2].open) & (c[-2].open > c[-3].open)
+    & (c[-1].close > c[-2].close) & (c[-2].close > c[-3].close))
+
+register('morning_star', 'bullish',
+    # A long red candle, a small body below it, then a long green candle
+    # whose body center is back inside the red body
+    c[-3].is_bearish & c[-1].is_bullish
+    & (c[-2].close < c[-3].close) & (c[-2].open < c[-3].close)
+    & (c[-2].close < c[-1].open) & (c[-2].open < c[-1].open)
+    & (c[-2].body / c[-3].body < 0.3) & (c[-1].body / c[-3].body >= 0.6)
+    & (c[-1].body_center > c[-3].close * 1.05) & (c[-1].body_center < c[-3].open * 0.95))
+
+# Bearish patterns, the mirror images of the bullish ones
+
+register('bearish_engulfing', 'bearish',
+    c[-3].is_bullish & c[-2].is_bearish
+    & (c[-2].close < c[-3].open) & (c[-2].open > c[-3].close)
+    & (c[-1].low < c[-2].low))
+
+register('three_black_crows', 'bearish',
+    c[-3].is_bearish & c[-2].is_bearish & c[-1].is_bearish
+    & (c[-1].open < c[-2].open) & (c[-2].open < c[-3].open)
+    & (c[-1].close < c[-2].close) & (c[-2].close < c[-3].close))
+
+register('evening_star', 'bearish',
+    c[-3].is_bullish & c[-1].is_bearish
+    & (c[-2].close > c[-3].close) & (c[-2].open > c[-3].close)
+    & (c[-2].close > c[-1].open) & (c[-2].open > c[-1].open)
+    & (c[-2].body / c[-3].body < 0.3) & (c[-1].body / c[-3].body >= 0.6)
+    & (c[-1].body_center < c[-3].close * 0.95) & (c[-1].body_center > c[-3].open * 1.05))
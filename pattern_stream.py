@@ -0,0 +1,123 @@
+from collections import deque, namedtuple
+from typing import Callable, Dict, List
+from pandas.core.frame import DataFrame
+from candle import Candle
+from indicators.streaming import OBVCross
+import pattern_registry as registry
+
+# A retracted event takes back the one emitted earlier for the same symbol,
+# timestamp and pattern, when the bar was replaced and no longer matches
+PatternEvent = namedtuple(
+    'PatternEvent',
+    ['symbol', 'timestamp', 'pattern', 'direction', 'obv_confirmed', 'close', 'volume', 'retracted'],
+    defaults=(False,)
+)
+
+
+class SymbolPatterns:
+    """
+    Running pattern state of one symbol: its last three candles in a ring
+    buffer and its OBV and OBV EMA (ewm(span=20)), updated one bar at a time.
+    """
+
+    def __init__(self, span=20):
+        self.candles = deque(maxlen=3)
+        self.obv = OBVCross(span=span)
+        self.timestamp = None
+        self.previous = None
+        # OBV confirmation of the patterns emitted for the current timestamp
+        self.emitted = {}
+
+    def update(self, open, high, low, close, volume, timestamp=None):
+        """
+        Adds a bar, or replaces the last one if it has the same timestamp
+        (e.g. a daily bar that is still forming), and returns the bitmask of
+        the registered patterns that end on it.
+        """
+        if timestamp is not None and timestamp == self.timestamp and self.previous is not None:
+            self._restore(self.previous)
+        else:
+            self.emitted = {}
+        self.previous = self._snapshot()
+        self.timestamp = timestamp
+
+        self.candles.append(Candle.from_values(open, high, low, close))
+        self.obv.update(close, volume)
+        if len(self.candles) < 3:
+            return 0
+        return registry.scan_last(list(self.candles))
+
+    def _snapshot(self):
+        obv, obv_ema = self.obv.obv, self.obv.obv_ema
+        return (
+            tuple(self.candles),
+            (obv.close, obv.total, obv.value),
+            (obv_ema.weighted_sum, obv_ema.weights, obv_ema.value),
+            self.obv.previous
+        )
+
+    def _restore(self, snapshot):
+        candles, obv_state, obv_ema_state, self.obv.previous = snapshot
+        self.candles = deque(candles, maxlen=3)
+        self.obv.obv.close, self.obv.obv.total, self.obv.obv.value = obv_state
+        self.obv.obv_ema.weighted_sum, self.obv.obv_ema.weights, self.obv.obv_ema.value = obv_ema_state
+
+
+class PatternStream:
+    """
+    Detects the registered candlestick patterns as bars arrive, for any number of symbols.
+
+    Each bar costs the same no matter how much history came before it. When a
+    pattern completes on a bar, a PatternEvent is passed to `on_pattern` and
+    returned from `update`. Bullish patterns are OBV-confirmed when the OBV
+    crossed above its EMA on that bar, bearish ones when it crossed below.
+
+    Events of a bar that can still be replaced (a bar with the same timestamp,
+    e.g. a forming daily bar) are provisional. The replacement emits the
+    pattern again when its OBV confirmation changed, and a retracted event
+    when the pattern no longer matches.
+    """
+
+    def __init__(self, on_pattern: Callable[[PatternEvent], None] = None, span=20):
+        self.on_pattern = on_pattern
+        self.span = span
+        self.symbols: Dict[str, SymbolPatterns] = {}
+
+    def seed(self, symbol, df: DataFrame):
+        """Feeds a symbol's warm-up bars (open, high, low, close, volume), oldest first, without emitting."""
+        state = self.symbols.setdefault(symbol, SymbolPatterns(self.span))
+        for timestamp, open, high, low, close, volume in zip(
+            df.index, df['open'].values, df['high'].values, df['low'].values, df['close'].values, df['volume'].values
+        ):
+            state.update(open, high, low, close, volume, timestamp)
+        return self
+
+    def update(self, symbol, open, high, low, close, volume, timestamp=None) -> List[PatternEvent]:
+        """Adds a bar of `symbol` and returns the patterns that completed on it."""
+        state = self.symbols.setdefault(symbol, SymbolPatterns(self.span))
+        mask = state.update(open, high, low, close, volume, timestamp)
+
+        events = []
+        for i, pattern in enumerate(registry.PATTERNS):
+            if mask & (1 << i):
+                if pattern.direction == 'bullish':
+                    confirmed = bool(state.obv.crossed_above)
+                else:
+                    confirmed = bool(state.obv.crossed_below)
+                if state.emitted.get(pattern.name) == confirmed:
+                    continue
+                state.emitted[pattern.name] = confirmed
+                events.append(PatternEvent(
+                    symbol, timestamp, pattern.name, pattern.direction, confirmed, float(close), float(volume)
+                ))
+            elif pattern.name in state.emitted:
+                del state.emitted[pattern.name]
+                events.append(PatternEvent(
+                    symbol, timestamp, pattern.name, pattern.direction, False, float(close), float(volume),
+                    retracted=True
+                ))
+
+        if self.on_pattern:
+            for event in events:
+                self.on_pattern(event)
+        return events
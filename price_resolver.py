@@ -0,0 +1,83 @@
+from datetime import datetime
+from typing import List
+import numpy as np
+import pandas as pd
+from bar_fetcher import BarFetcher
+from bar_panel import BarPanel
+from bar_store import BAR_COLUMNS
+
+PRICE_FIELDS = ['open', 'close', 'vwap']
+
+
+class PriceResolver:
+    """
+    Looks up daily prices for many (symbol, date) pairs at once.
+
+    Prices come from the bar panel. Pairs the panel does not cover are
+    downloaded together in one batch and kept for later lookups.
+    The daily 'vwap' is approximated with the typical price (high + low + close) / 3.
+    """
+
+    def __init__(self, panel: BarPanel, fetcher: BarFetcher):
+        self.panel = panel
+        self.panel_dates = panel.dates.normalize()
+        self.fetcher = fetcher
+        self.extra = {}
+        self.attempted = set()
+
+    def resolve(self, symbols: List[str], dates, field='open') -> np.ndarray:
+        """
+        Returns the `field` price of each (symbols[i], dates[i]) pair, NaN where there was no bar.
+
+        :param symbols: symbol of each pair
+        :param dates: date of each pair, or a single date for all of them
+        :param field: 'open', 'close' or 'vwap'
+        """
+        assert field in PRICE_FIELDS
+        if not isinstance(dates, (list, pd.DatetimeIndex, np.ndarray)):
+            dates = [dates] * len(symbols)
+        dates = pd.DatetimeIndex([pd.Timestamp(date) for date in dates])
+        if dates.tz is None:
+            dates = dates.tz_localize(self.panel.dates.tz)
+        dates = dates.tz_convert(self.panel.dates.tz).normalize()
+        bars = self._lookup(symbols, dates)
+
+        # Only download pairs that have not been tried before
+        missing = np.isnan(bars[:, 3]) & np.array([
+            (symbol, date) not in self.attempted for symbol, date in zip(symbols, dates)
+        ], dtype=bool)
+        if missing.any():
+            missing_symbols = [symbols[i] for i in np.flatnonzero(missing)]
+            self._fetch_missing(missing_symbols, dates[missing])
+            self.attempted.update(zip(missing_symbols, dates[missing]))
+            bars[missing] = self._lookup(missing_symbols, dates[missing])
+
+        if field == 'vwap':
+            return (bars[:, 1] + bars[:, 2] + bars[:, 3]) / 3
+        return bars[:, BAR_COLUMNS.index(field)]
+
+    def _lookup(self, symbols, dates):
+        bars = np.full((len(symbols), len(BAR_COLUMNS)), np.nan)
+        date_positions = self.panel_dates.get_indexer(dates)
+        symbol_positions = np.array([self.panel.positions.get(symbol, -1) for symbol in symbols], dtype=int)
+        in_panel = (date_positions >= 0) & (symbol_positions >= 0)
+        bars[in_panel] = self.panel.data[symbol_positions[in_panel], date_positions[in_panel]]
+
+        # Fall back on anything downloaded earlier
+        for i in np.flatnonzero(np.isnan(bars[:, 3])):
+            df = self.extra.get(symbols[i])
+            if df is not None and dates[i] in df.index:
+                bars[i] = df.loc[dates[i], BAR_COLUMNS].values
+        return bars
+
+    def _fetch_missing(self, symbols, dates):
+        start = datetime.isoformat(dates.min())
+        end = datetime.isoformat(dates.max())
+        fetched = self.fetcher.get_barset_df(list(set(symbols)), '1D', start=start, end=end, limit=1000)
+        for symbol, df in fetched.items():
+            df = df.loc[df['close'] > 0]
+            df.index = df.index.normalize()
+            if symbol in self.extra:
+                df = pd.concat([self.extra[symbol], df])
+                df = df[~df.index.duplicated(keep='last')]
+            self.extra[symbol] = df
@@ -1,35 +1,25 @@
 from datetime import datetime, timedelta
 from time import time
 from typing import Dict
-from btalib.indicators.cci import cci
-from btalib.indicators.obv import obv
-from btalib.indicators.rsi import rsi
-from google.cloud import storage
+from alpaca_client import get_api
 import math
 import pandas as pd
 pd.set_option('mode.chained_assignment', None)
-from alpaca_trade_api import REST
-from scipy.stats import linregress
-import detect_pattern as pattern
-
-def chunks(l, n):
-    n = max(1, n)
-    return (l[i:i+n] for i in range(0, len(l), n))
-
-def select_swing_stocks(date: datetime, position_data: Dict, portfolio_amount: float):
-    # Get Alpaca API key and secret
-    storage_client = storage.Client()
-    bucket = storage_client.get_bucket('derek-algo-trading-bucket')
-    blob = bucket.blob('alpaca-api-key.txt')
-    api_key = blob.download_as_text()
-    blob = bucket.blob('alpaca-secret-key.txt')
-    secret_key = blob.download_as_text()
-    base_url = 'https://paper-api.alpaca.markets'
-    api = REST(api_key, secret_key, base_url, 'v2')
+from bar_store import BarStore
+from bar_panel import BarPanel
+from pattern_index import PatternIndex
+from select_swing_stocks import bearish_patterns, bullish_patterns, held_indicator_values
+
+def select_swing_stocks(date: datetime, position_data: Dict, portfolio_amount: float, panel: BarPanel = None,
+                        pattern_index: PatternIndex = None):
+    api = get_api()
 
     # Get all stocks
-    assets = api.list_assets('active')
-    symbols = [asset.symbol for asset in assets if asset.tradable]
+    if panel:
+        symbols = panel.symbols
+    else:
+        assets = api.list_assets('active')
+        symbols = [asset.symbol for asset in assets if asset.tradable]
 
     # Display currently held positions
     if position_data:
@@ -43,28 +33,49 @@ def select_swing_stocks(date: datetime, position_data: Dict, portfolio_amount: f
         current_percent = (current_price - entry_price) / entry_price * 100
         print('{}: {}%'.format(symbol, '%.2f' % current_percent))
 
+    # With a pattern index the buy candidates are already known,
+    # only the held stocks need their history
+    if pattern_index:
+        symbols = [symbol for symbol in symbols if symbol in position_symbols]
+
     # Get past 1000 days data for all stocks
-    data = {}
-    print(f'Retrieving {len(symbols)} symbol data...')
-    symbols_chunked = list(chunks(list(set(symbols)), 200))
     previous_day = datetime.isoformat(pd.Timestamp(date - timedelta(days=1)))
-    for symbol_group in symbols_chunked:
-        data_group = api.get_barset(','.join(symbol_group), '1D', end=previous_day, limit=1000).df
-        for symbol in symbol_group:
-            data[symbol] = data_group[symbol]
+    if panel:
+        # Slice the prebuilt panel instead of downloading again
+        data = {symbol: panel.history(symbol, previous_day, limit=1000) for symbol in symbols}
+    else:
+        print(f'Retrieving {len(symbols)} symbol data...')
+        data = BarStore(api).get_bars(list(set(symbols)), '1D', limit=1000, end=previous_day)
     
+    frames = {}
+    for symbol in data.keys():
+        df = pd.DataFrame(data[symbol])
+        frames[symbol] = df.loc[df['close'] > 0]
+
+    # Compute the indicators for all stocks at once
+    candidates = [
+        symbol for symbol in frames if symbol not in position_symbols and len(frames[symbol]) >= 1000
+    ]
+    patterns_found = dict(zip(candidates, bullish_patterns(candidates, [frames[symbol] for symbol in candidates])))
+    held = [symbol for symbol in frames if symbol in position_symbols]
+    held_indicators = held_indicator_values(held, [frames[symbol] for symbol in held])
+    held_indicators = {symbol: values for symbol, values in zip(held, held_indicators)}
+    bearish_found = dict(zip(held, bearish_patterns([frames[symbol] for symbol in held])))
+
     buy_df = pd.DataFrame()
     sell_df = pd.DataFrame()
     hold_df = pd.DataFrame()
 
+    if pattern_index:
+        buy_df = pattern_index.candidates(date, exclude=position_symbols)
+
     # c = 0
     print('Processing daily bars for all stocks...')
-    for symbol in data.keys():
-        df = pd.DataFrame(data[symbol])
-        df = df.loc[df['close'] > 0]
+    for symbol in frames.keys():
+        df = frames[symbol]
         if symbol not in position_symbols and len(df) >= 1000:
             df['symbol'] = symbol
-            df['bullish'] = pattern.detect_bullish_patterns(df)
+            df['bullish'] = patterns_found[symbol]
             buy_df = buy_df.append(df.loc[df.index == df.index.max()])
 
         elif symbol in position_symbols:
@@ -72,8 +83,7 @@ def select_swing_stocks(date: datetime, position_data: Dict, portfolio_amount: f
             df['qty'] = int(position_data[symbol]['qty'])
             df['market_value'] = float(position_data[symbol]['market_value'])
 
-            latest_rsi = rsi(df).df.tail(1)['rsi'][0]
-            latest_cci = cci(df).df.tail(1)['cci'][0]
+            latest_rsi, latest_cci, recent_obv, latest_obv_ema, slope = held_indicators[symbol]
             purchase_price = float(position_data[symbol]['avg_entry_price'])
             latest_price = float(position_data[symbol]['current_price'])
             df['purchase_price'] = purchase_price
@@ -90,20 +100,18 @@ def select_swing_stocks(date: datetime, position_data: Dict, portfolio_amount: f
                 print(f'Overbought, RSI={round(latest_rsi, 0)}, CCI={round(latest_cci, 0)}: SELL')
                 sell_df = sell_df.append(df.loc[df.index == df.index.max()])
 
+            # Or if a bearish pattern just formed
+            elif bearish_found[symbol]:
+                print(f"Bearish {', '.join(bearish_found[symbol])}: SELL")
+                sell_df = sell_df.append(df.loc[df.index == df.index.max()])
+
             # If price is at/above entry
             # Check if the swing is still swinging
             else:
                 print(f'Price ${latest_price} is near/above entry ${purchase_price}')
-                obv_df = obv(df).df
-                obv_df['obv_ema'] = obv_df['obv'].ewm(span=20).mean()
-
                 # Is the OBV still above it's EMA
-                if obv_df.tail(1)['obv'][0] > obv_df.tail(1)['obv_ema'][0]:
+                if recent_obv[-1] > latest_obv_ema:
                     print('OBV is still above OBV_EMA')
-                    slope = linregress(
-                        [0, 1, 2],
-                        obv_df.tail(3)['obv'].tolist()
-                    ).slope
                     if slope > 0:
                         print(f'OBV is increasing with a slope of {slope}: HOLD')
                         hold_df = hold_df.append(df.loc[df.index == df.index.max()])
@@ -1,28 +1,18 @@
-from btalib.indicators.cci import cci
-from btalib.indicators.obv import obv
-from btalib.indicators.rsi import rsi
-from google.cloud import storage
+from alpaca_client import get_api
 import math
+import numpy as np
 import pandas as pd
 pd.set_option('mode.chained_assignment', None)
-from alpaca_trade_api import REST
-from scipy.stats import linregress
 import detect_pattern as pattern
-
-def chunks(l, n):
-    n = max(1, n)
-    return (l[i:i+n] for i in range(0, len(l), n))
+from bar_store import BAR_COLUMNS, BAR_DTYPE, BarStore
+from indicators import engine
+from indicators.cache import get_cache
+from pattern_index import PatternIndex
+from candle import CandleArray
+import pattern_registry
 
 def select_swing_stocks():
-    # Get Alpaca API key and secret
-    storage_client = storage.Client()
-    bucket = storage_client.get_bucket('derek-algo-trading-bucket')
-    blob = bucket.blob('alpaca-api-key.txt')
-    api_key = blob.download_as_text()
-    blob = bucket.blob('alpaca-secret-key.txt')
-    secret_key = blob.download_as_text()
-    base_url = 'https://paper-api.alpaca.markets'
-    api = REST(api_key, secret_key, base_url, 'v2')
+    api = get_api()
 
     # Get all stocks
     assets = api.list_assets('active')
@@ -41,30 +31,50 @@ def select_swing_stocks():
         position_data[position.symbol] = position
     print()
 
-    # Get past 50 days data for all stocks
-    data = {}
-    symbols_chunked = list(chunks(list(set(symbols)), 200))
-    for symbol_group in symbols_chunked:
-        print(f'Retrieving {len(symbol_group)} symbol data')
-        data_group = api.get_barset(','.join(symbol_group), '1D', limit=1000).df
-        for symbol in symbol_group:
-            data[symbol] = data_group[symbol]
+    # Get past 1000 days data for all stocks
+    # Only the bars since the last run are downloaded
+    data = BarStore(api).get_bars(list(set(symbols)), '1D', limit=1000)
     
+    frames = {}
+    for symbol in data.keys():
+        df = pd.DataFrame(data[symbol])
+        frames[symbol] = df.loc[df['close'] > 0]
+
+    # Compute the indicators for all stocks at once
+    # The bullish patterns of the last day are found for every stock with 1000 days,
+    # held or not, and appended to the pattern index the backtests read
+    screened = [symbol for symbol in frames if len(frames[symbol]) == 1000]
+    dates, bars, codes, crossed = last_day_patterns(screened, [frames[symbol] for symbol in screened])
+    pattern_index = PatternIndex()
+    enough = np.array([len(frames[symbol]) >= pattern_index.min_history for symbol in screened], dtype=bool)
+    pattern_index.add_day(
+        [symbol for symbol, kept in zip(screened, enough) if kept],
+        dates[enough], bars[enough], codes[enough], crossed[enough]
+    )
+    patterns_found = {
+        symbol: pattern.BULLISH_PATTERNS[code] if confirmed else ''
+        for symbol, code, confirmed in zip(screened, codes, crossed)
+    }
+    held = [symbol for symbol in frames if symbol in position_symbols]
+    held_indicators = held_indicator_values(held, [frames[symbol] for symbol in held])
+    held_indicators = {symbol: values for symbol, values in zip(held, held_indicators)}
+    bearish_found = dict(zip(held, bearish_patterns([frames[symbol] for symbol in held])))
+    get_cache().print_stats()
+
     buy_df = pd.DataFrame()
     sell_df = pd.DataFrame()
     hold_df = pd.DataFrame()
 
     c = 0
-    for symbol in data.keys():
-        df = pd.DataFrame(data[symbol])
-        df = df.loc[df['close'] > 0]
+    for symbol in frames.keys():
+        df = frames[symbol]
         if symbol not in position_symbols and len(df) == 1000:
             df['symbol'] = symbol
 
             # bullish pattern detection
             # bullish = [''] * len(df)
             # bullish[len(bullish) - 1] = pattern.detect_bullish_patterns(df)
-            df['bullish'] = pattern.detect_bullish_patterns(df)
+            df['bullish'] = patterns_found[symbol]
             buy_df = buy_df.append(df.loc[df.index == df.index.max()])
         
         elif symbol in position_symbols:
@@ -73,8 +83,7 @@ def select_swing_stocks():
             df['qty'] = int(position_data[symbol].qty)
             df['market_value'] = float(position_data[symbol].market_value)
             
-            latest_rsi = rsi(df).df.tail(1)['rsi'][0]
-            latest_cci = cci(df).df.tail(1)['cci'][0]
+            latest_rsi, latest_cci, recent_obv, latest_obv_ema, slope = held_indicators[symbol]
             purchase_price = float(position_data[symbol].avg_entry_price)
             latest_price = float(position_data[symbol].current_price)
             df['purchase_price'] = purchase_price
@@ -88,21 +97,18 @@ def select_swing_stocks():
             elif latest_rsi >= 70 or latest_cci >= 100:
                 print(f'Overbought, RSI={latest_rsi}, CCI={latest_cci}: SELL')
                 sell_df = sell_df.append(df.loc[df.index == df.index.max()])
+            # Or if a bearish pattern just formed, GET IT OUT
+            elif bearish_found[symbol]:
+                print(f"Bearish {', '.join(bearish_found[symbol])}: SELL")
+                sell_df = sell_df.append(df.loc[df.index == df.index.max()])
 
             # If price is at/above entry
             # Check if the swing is still swinging
             elif latest_price >= purchase_price:
                 print(f'Price ${latest_price} is at/above entry ${purchase_price}')
-                obv_df = obv(df).df
-                obv_df['obv_ema'] = obv_df['obv'].ewm(span=20).mean()
-
                 # Is the OBV still above it's EMA
-                if obv_df.tail(1)['obv'][0] > obv_df.tail(1)['obv_ema'][0]:
+                if recent_obv[-1] > latest_obv_ema:
                     print('OBV is still above OBV_EMA')
-                    slope = linregress(
-                        [0, 1, 2],
-                        obv_df.tail(3)['obv'].tolist()
-                    ).slope
                     if slope > 0:
                         print(f'OBV is increasing with a slope of {slope}: HOLD')
                         hold_df = hold_df.append(df.loc[df.index == df.index.max()])
@@ -111,8 +117,8 @@ def select_swing_stocks():
 
         c += 1
         if c % 100 == 0:
-            print(f'{c}/{len(data.keys())}')
-    print(f'{c}/{len(data.keys())}\n')
+            print(f'{c}/{len(frames.keys())}')
+    print(f'{c}/{len(frames.keys())}\n')
     
     # END SCREENING SECTION
     
@@ -163,3 +169,88 @@ def select_swing_stocks():
         buy_stocks = pd.DataFrame()
 
     return (buy_stocks, sell_stocks, hold_stocks)
+
+
+def bullish_patterns(symbols, frames, timeframe='1D'):
+    """
+    The bullish candlestick pattern confirmed by the OBV on the last day of each stock's bars,
+    or '' (see detect_pattern.detect_bullish_patterns).
+    """
+    if len(frames) == 0:
+        return []
+    _, _, codes, crossed = last_day_patterns(symbols, frames, timeframe)
+    return [pattern.BULLISH_PATTERNS[code] if confirmed else '' for code, confirmed in zip(codes, crossed)]
+
+
+def last_day_patterns(symbols, frames, timeframe='1D'):
+    """
+    Returns the dates and bars (symbols, 3, OHLCV) of the last 3 days of each stock,
+    the index in detect_pattern.BULLISH_PATTERNS of the pattern ending on the last day
+    whether or not the OBV confirmed it, and whether the OBV crossed above its EMA that day.
+    """
+    bars = np.stack([engine.stack(frames, column, 3) for column in BAR_COLUMNS], axis=2)
+    dates = np.full((len(frames), 3), np.datetime64('NaT'), dtype='datetime64[ns]')
+    for i, df in enumerate(frames):
+        # UTC datetime64 values of the index
+        last_dates = df.index.values[-3:]
+        dates[i, 3 - len(last_dates):] = last_dates
+    open, high, low, close = [bars[:, :, k] for k in range(4)]
+    codes = pattern.scan_bullish_patterns(open, high, low, close, obv_crossed=True)[:, -1]
+    crossed = np.array(obv_cross_values(symbols, frames, timeframe), dtype=bool)
+    return dates, bars, codes, crossed
+
+
+def bearish_patterns(frames):
+    """
+    The bearish candlestick patterns ending on the last day of each stock's bars.
+    """
+    if len(frames) == 0:
+        return []
+    candles = CandleArray(*[engine.stack(frames, column, 3) for column in ['open', 'high', 'low', 'close']])
+    return [pattern_registry.matched(mask, 'bearish') for mask in pattern_registry.scan(candles)[:, -1]]
+
+
+def obv_cross_values(symbols, frames, timeframe='1D'):
+    """
+    Whether each stock's OBV crossed above its EMA on its last bar.
+    Not cached, computing it takes less time than hashing the bars for a cache key.
+    """
+    if len(frames) == 0:
+        return []
+    length = max([len(df) for df in frames])
+    close, volume = [engine.stack(frames, column, length, dtype=BAR_DTYPE) for column in ['close', 'volume']]
+    return [bool(crossed) for crossed in engine.obv_cross_up(close, volume)]
+
+
+def held_indicator_values(symbols, frames, timeframe='1D'):
+    """
+    Returns (RSI, CCI, last 3 OBV values, OBV EMA, slope of the last 3 OBV values)
+    on the last day of each held stock's bars.
+    """
+    if len(frames) == 0:
+        return []
+    length = max([len(df) for df in frames])
+    high, low, close, volume = [
+        engine.stack(frames, column, length, dtype=BAR_DTYPE) for column in ['high', 'low', 'close', 'volume']
+    ]
+    cache = get_cache()
+    keys = cache.keys(
+        symbols, timeframe, [df.index for df in frames], [high, low, close, volume],
+        'held_indicators', (14, 20, 20, 3)
+    )
+
+    def compute(missing):
+        if length < 3:
+            return np.full((len(missing), 7), np.nan)
+        high_rows, low_rows, close_rows, volume_rows = high[missing], low[missing], close[missing], volume[missing]
+        rsi = engine.rsi(close_rows)[:, -1]
+        cci = engine.cci(high_rows, low_rows, close_rows)[:, -1]
+        obv = engine.obv(close_rows, volume_rows)
+        obv_ema = engine.ewm_tail(obv, span=20)[:, -1]
+        obv_slope = engine.slope(obv[:, -3:], window=3)[:, -1]
+        # One row of [rsi, cci, obv, obv, obv, obv_ema, obv_slope] per stock
+        return np.column_stack([rsi, cci, obv[:, -3:], obv_ema, obv_slope])
+
+    return [
+        (values[0], values[1], values[2:5], values[5], values[6]) for values in cache.rows(keys, compute)
+    ]
@@ -1,16 +1,16 @@
 import sys
 import math
 import statistics
-import time as t
 from datetime import datetime as dt, timedelta
 import pandas as pd
 from pandas.plotting import register_matplotlib_converters
 import numpy as np
-from indicators.cci_indicator import cci_check
-from indicators.macd_indicator import macd_check
-from indicators.rsi_indicator import rsi_check
+from indicators.cci_indicator import cci_signals
+from indicators.macd_indicator import macd_signals
+from indicators.rsi_indicator import rsi_signals
 from indicators.stoch_indicator import stoch_check
-from indicators.vwap_indicator import vwap_check
+from indicators.vwap_indicator import vwap_signals
+from indicators.intraday import intraday_indicators
 from helpers import is_market_open, portfolio_input
 from yahoo_finance_stocks import get_10_best_active_stocks
 import matplotlib.pyplot as plot
@@ -21,9 +21,7 @@ def main(args, portfolio_amount):
     # Retrieve API Key
     from secrets import ALPHA_VANTAGE_TOKEN
     from alpha_vantage.timeseries import TimeSeries
-    from alpha_vantage.techindicators import TechIndicators
     ts = TimeSeries(key=ALPHA_VANTAGE_TOKEN, output_format='pandas')
-    ti = TechIndicators(key=ALPHA_VANTAGE_TOKEN, output_format='pandas')
 
     # If no symbols were passed in
     # Retrieve top volatile stocks from Yahoo Finance
@@ -50,8 +48,6 @@ def main(args, portfolio_amount):
     print(f"Testing a portfolio of $%.2f across {len(symbols)} stock{'s' if len(symbols) > 1 else ''}" % portfolio)
     
     for symbol in symbols:
-        print('Waiting 1 minute to ensure API availability...')
-        t.sleep(60)
         print('===================================')
         print(f'Trading {symbol} using {interval} intervals on {trading_day}...\n')
 
@@ -62,33 +58,13 @@ def main(args, portfolio_amount):
             print(f'Error: {symbol} not found.\n')
             continue
         intraday = intraday.sort_index()
-        intraday = intraday[intraday.index.to_series().between(f'{trading_day} 09:00:00', f'{trading_day} 18:00:00')]
 
-        # Get MACD data
-        macd_data, _ = ti.get_macd(symbol=symbol, interval=interval)
-        macd_data = macd_data.sort_index()
+        # Calculate the MACD, RSI, CCI, OBV, VWAP and Stochastic Oscillator
+        # from the intraday bars instead of requesting each one
+        indicators = intraday_indicators(intraday)
 
-        # Get RSI data
-        rsi_data, _ = ti.get_rsi(symbol=symbol, interval=interval)
-        rsi_data = rsi_data.sort_index()
-        
-        # Get CCI data
-        cci_data, _ = ti.get_cci(symbol=symbol, interval=interval)
-        cci_data = cci_data.sort_index()
-
-        # Get OBV data
-        obv_date, _ = ti.get_obv(symbol=symbol, interval=interval)
-        obv_date = obv_date.sort_index()
-
-        # Get VWAP data
-        # vwap_data, _ = ti.get_vwap(symbol=symbol, interval=interval)
-        # vwap_data = vwap_data.sort_index()
-
-        # Get the Stochastic Oscillator data
-        # stoch_data, _ = ti.get_stoch(symbol=symbol, interval=interval)
-        # stoch_data = stoch_data.sort_index()
-
-        stock_data = pd.concat([intraday, macd_data, rsi_data, cci_data, obv_date], axis=1, join="inner")
+        stock_data = pd.concat([intraday, indicators], axis=1, join="inner")
+        stock_data = stock_data[stock_data.index.to_series().between(f'{trading_day} 09:00:00', f'{trading_day} 18:00:00')]
         # print(stock_data)
 
         Transactions = {}
@@ -98,6 +74,41 @@ def main(args, portfolio_amount):
         initial_loss_percentage = 0.98
         trailing_loss_percentage = 0.96
 
+        # Score every interval at once, for both holding and not holding,
+        # and look the signals up by position in the loop below
+        close_prices = stock_data['4. close'].values
+        macd_values, signal_values = stock_data['MACD'].values, stock_data['MACD_Signal'].values
+        rsi_values, cci_values = stock_data['RSI'].values, stock_data['CCI'].values
+        vwap_values = stock_data['VWAP'].values
+        prev_macd, prev_signal = np.roll(macd_values, 1), np.roll(signal_values, 1)
+        prev_rsi, prev_cci = np.roll(rsi_values, 1), np.roll(cci_values, 1)
+        signals = {
+            'MACD': (
+                macd_signals(macd_values, prev_macd, signal_values, prev_signal, False)[0],
+                macd_signals(macd_values, prev_macd, signal_values, prev_signal, True)[1]
+            ),
+            'RSI': (
+                rsi_signals(rsi_values, prev_rsi, False)[0],
+                rsi_signals(rsi_values, prev_rsi, True)[1]
+            ),
+            'CCI': (
+                cci_signals(cci_values, prev_cci, False)[0],
+                cci_signals(cci_values, prev_cci, True)[1]
+            ),
+            'VWAP': (
+                vwap_signals(vwap_values, close_prices, False)[0],
+                vwap_signals(vwap_values, close_prices, True)[1]
+            )
+        }
+
+        def signal_action(indicator, i, position):
+            buy, sell = signals[indicator]
+            if not position and buy[i]:
+                return 'Buy'
+            if position and sell[i]:
+                return 'Sell'
+            return None
+
         Transactions[trading_day] = []
         trade_triggers = {}
         for i in range(0, len(stock_data.index)):
@@ -111,30 +122,27 @@ def main(args, portfolio_amount):
                     str(stock_data.index[i-1]).split(' ')[1],
                     str(stock_data.index[i-2]).split(' ')[1],
                 ]
-                close_price = stock_data['4. close'][datetime]
+                close_price = close_prices[i]
 
-                macd = stock_data['MACD'][datetime]
-                prev_macd = stock_data['MACD'][stock_data.index[i-1]]
-                signal = stock_data['MACD_Signal'][datetime]
-                prev_signal = stock_data['MACD_Signal'][stock_data.index[i-1]]
-                macd_action = macd_check(macd, prev_macd, signal, prev_signal, position)
+                macd = macd_values[i]
+                signal = signal_values[i]
+                macd_action = signal_action('MACD', i, position)
                 if macd_action:
                     trade_triggers[interval_time][macd_action]['MACD'] = { 'MACD': macd, 'MACD Signal': signal }
 
-                rsi = stock_data['RSI'][datetime]
-                prev_rsi = stock_data['RSI'][stock_data.index[i-1]]
-                rsi_action = rsi_check(rsi, prev_rsi, position)
+                rsi = rsi_values[i]
+                rsi_action = signal_action('RSI', i, position)
                 if rsi_action:
                     trade_triggers[interval_time][rsi_action]['RSI'] = rsi
 
-                cci = stock_data['CCI'][datetime]
-                prev_cci = stock_data['CCI'][stock_data.index[i-1]]
-                cci_action = cci_check(cci, prev_cci, position)
+                cci = cci_values[i]
+                prev_cci = cci_values[i-1]
+                cci_action = signal_action('CCI', i, position)
                 if cci_action:
                     trade_triggers[interval_time][cci_action]['CCI'] = { 'CCI': cci, 'CCI_PREV': prev_cci }
 
-                vwap = stock_data['VWAP'][datetime]
-                vwap_action = vwap_check(vwap, close_price, position)
+                vwap = vwap_values[i]
+                vwap_action = signal_action('VWAP', i, position)
                 if vwap_action:
                     trade_triggers[interval_time][vwap_action]['VWAP'] = { 'VWAP': vwap }
                 
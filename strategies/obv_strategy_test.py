@@ -1,11 +1,11 @@
 import sys
 import math
-import time as t
 from datetime import datetime as dt, timedelta
 import pandas as pd
 from pandas.plotting import register_matplotlib_converters
 import numpy as np
 from helpers import is_market_open, portfolio_input
+from indicators.intraday import obv
 from yahoo_finance_stocks import get_10_best_active_stocks
 import matplotlib.pyplot as plot
 plot.style.use('fivethirtyeight')
@@ -15,9 +15,7 @@ def obv_strategy(args, portfolio_amount):
     # Retrieve API Key
     from secrets import ALPHA_VANTAGE_TOKEN
     from alpha_vantage.timeseries import TimeSeries
-    from alpha_vantage.techindicators import TechIndicators
     ts = TimeSeries(key=ALPHA_VANTAGE_TOKEN, output_format='pandas')
-    ti = TechIndicators(key=ALPHA_VANTAGE_TOKEN, output_format='pandas')
 
     # If no symbols were passed in
     # Retrieve top volatile stocks from Yahoo Finance
@@ -44,9 +42,6 @@ def obv_strategy(args, portfolio_amount):
     print(f"Testing a portfolio of $%.2f across {len(symbols)} stock{'s' if len(symbols) > 1 else ''}" % portfolio)
     
     for symbol in symbols:
-        if len(symbols) > 2 and  symbols.index(symbol) % 2 == 0:
-            print('Waiting 1 minute to ensure API availability...')
-            t.sleep(60)
         print('===================================')
         print(f'Trading {symbol} using {interval} intervals on {trading_day}...\n')
 
@@ -58,14 +53,15 @@ def obv_strategy(args, portfolio_amount):
             continue
         intraday = intraday.sort_index()
         print(intraday.index)
-        intraday = intraday[intraday.index.to_series().between(f'{trading_day} 00:00:00', f'{trading_day} 23:59:59')]
 
-        # Get OBV data
-        obv_data, _ = ti.get_obv(symbol=symbol, interval=interval)
-        obv_data = obv_data.sort_index()
+        # Calculate the OBV from the intraday bars
+        obv_data = pd.DataFrame({
+            'OBV': obv(intraday['4. close'].values, intraday['5. volume'].values)
+        }, index=intraday.index)
         obv_data['OBV_EMA'] = obv_data['OBV'].ewm(span=20).mean()
         
         stock_data = pd.concat([intraday, obv_data], axis=1, join="inner")
+        stock_data = stock_data[stock_data.index.to_series().between(f'{trading_day} 00:00:00', f'{trading_day} 23:59:59')]
         print(stock_data)
 
         Transactions = {}
@@ -0,0 +1,109 @@
+import os
+from datetime import datetime
+import numpy as np
+import pandas as pd
+
+CALENDAR_PATH = os.environ.get('CALENDAR_PATH', 'data/calendar.npz')
+
+MARKET_TZ = 'America/New_York'
+
+
+class TradingCalendar:
+    """
+    Local copy of the Alpaca market calendar.
+
+    Sessions are kept as a sorted array of dates with their open and close
+    times, so lookups are binary searches instead of API calls. The file
+    is downloaded again once a year.
+    """
+
+    def __init__(self, api, path=CALENDAR_PATH):
+        self.api = api
+        self.path = path
+        self.dates = None
+
+    def is_session(self, date) -> bool:
+        """Whether the market was/is open on `date`."""
+        dates = self._load()
+        day = self._day(date)
+        i = dates.searchsorted(day)
+        return i < len(dates) and dates[i] == day
+
+    def sessions_between(self, start, end) -> pd.DatetimeIndex:
+        """All session dates from `start` through `end` (inclusive)."""
+        dates = self._load()
+        i = dates.searchsorted(self._day(start), side='left')
+        j = dates.searchsorted(self._day(end), side='right')
+        return self._to_index(dates[i:j])
+
+    def last_sessions(self, date, n) -> pd.DatetimeIndex:
+        """The last `n` session dates on or before `date`."""
+        dates = self._load()
+        j = dates.searchsorted(self._day(date), side='right')
+        return self._to_index(dates[max(0, j - n):j])
+
+    def offset(self, date, n) -> pd.Timestamp:
+        """
+        The session `n` sessions away from `date`, e.g. offset(date, -5) is 5 sessions before.
+        A date the market was closed counts from the sessions on either side of it.
+        """
+        dates = self._load()
+        day = self._day(date)
+        i = dates.searchsorted(day, side='left')
+        if n > 0 and (i >= len(dates) or dates[i] != day):
+            i -= 1
+        if not 0 <= i + n < len(dates):
+            raise ValueError(
+                f'{n} sessions from {day} is outside the calendar ({dates[0]} to {dates[-1]})'
+            )
+        return self._to_index(dates[i + n:i + n + 1])[0]
+
+    def session_hours(self, date):
+        """Returns the (open, close) timestamps of the session on `date`, None if the market was closed."""
+        if not self.is_session(date):
+            return None
+        i = self.dates.searchsorted(self._day(date))
+        return (
+            pd.Timestamp(self.opens[i]).tz_localize('UTC').tz_convert(MARKET_TZ),
+            pd.Timestamp(self.closes[i]).tz_localize('UTC').tz_convert(MARKET_TZ)
+        )
+
+    def refresh(self):
+        """Downloads the calendar through the end of next year."""
+        this_year = datetime.today().year
+        calendars = self.api.get_calendar(start='2000-01-01', end=f'{this_year + 1}-12-31')
+        days = pd.DatetimeIndex([pd.Timestamp(calendar.date.strftime('%Y-%m-%d')) for calendar in calendars])
+        opens = pd.DatetimeIndex([
+            pd.Timestamp(f"{calendar.date.strftime('%Y-%m-%d')} {calendar.open.strftime('%H:%M')}")
+            for calendar in calendars
+        ]).tz_localize(MARKET_TZ).tz_convert('UTC').tz_localize(None)
+        closes = pd.DatetimeIndex([
+            pd.Timestamp(f"{calendar.date.strftime('%Y-%m-%d')} {calendar.close.strftime('%H:%M')}")
+            for calendar in calendars
+        ]).tz_localize(MARKET_TZ).tz_convert('UTC').tz_localize(None)
+
+        directory = os.path.dirname(self.path)
+        if directory and not os.path.exists(directory):
+            os.makedirs(directory)
+        np.savez(self.path, dates=days.values, opens=opens.values, closes=closes.values, year=this_year)
+        self.dates = None
+
+    def _load(self):
+        if self.dates is None:
+            if not os.path.exists(self.path) or int(np.load(self.path)['year']) < datetime.today().year:
+                self.refresh()
+            calendar = np.load(self.path)
+            self.dates = calendar['dates'].astype('datetime64[D]')
+            self.opens = calendar['opens']
+            self.closes = calendar['closes']
+        return self.dates
+
+    def _day(self, date):
+        # Use the market's date for timezone aware timestamps
+        date = pd.Timestamp(date)
+        if date.tzinfo is not None:
+            date = date.tz_convert(MARKET_TZ)
+        return np.datetime64(date.strftime('%Y-%m-%d'), 'D')
+
+    def _to_index(self, days):
+        return pd.DatetimeIndex(days.astype('datetime64[ns]')).tz_localize(MARKET_TZ)